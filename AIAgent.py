@@ -1,101 +1,89 @@
 import numpy as np
-import copy
-from tensorflow.keras.models import load_model
 from Player import Player
+from MoveGenerator import legal_moves
+from Board import zobrist_hash
+from Symmetry import canonical_masks
+from FeatureEncoder import encode_boards, encode_masks
+from ModelRegistry import models
+from Log import log
+
 
 class AiAgent(Player):
-    def __init__(self, board, marker):
+    def __init__(self, board, marker, model_file='ann_model.keras'):
         super().__init__(board, marker)
-        self.model = load_model('ann_model.keras')
+        self.model = models.get(model_file)  # Loaded once per process and shared
+        self.cache = models.cache(model_file)  # Scores of positions seen by any AiAgent
 
     def get_all_legal_moves(self):
-        moves = []
-        # Find the empty space first
-        empty_pos = None
-        for i in range(3):
-            for j in range(3):
-                if self.board.board[i][j] is None:
-                    empty_pos = (i, j)
-                    break
-            if empty_pos:
-                break
-
-        if empty_pos is None:
-            print("DEBUG: No empty space found on board")
-            return moves
-
-        empty_row, empty_col = empty_pos
-
-        # For each part on the board
-        for i in range(3):
-            for j in range(3):
-                if self.board.board[i][j] is None:
-                    continue
-                # Only consider parts adjacent to the empty space
-                if (abs(i - empty_row) == 1 and j == empty_col) or (abs(j - empty_col) == 1 and i == empty_row):
-                    # For each empty slot in the part
-                    for k in range(2):
-                        for l in range(2):
-                            if self.board.board[i][j].slots[k][l] == 0:
-                                moves.append(((i, j), (k, l), empty_pos))
-        return moves
+        return legal_moves(self.board)
 
     def encode_board(self, board=None):
         """
         Encode the current board into a numpy array suitable for the model.
+        The canonical (symmetry-reduced) key is encoded, matching the training data.
         """
         if board is None:
             board = self.board
-        key = board.str_board_history()
-        features = []
-        for ch in key:
-            if ch == '0':
-                features.append(0)
-            elif ch == '1':
-                features.append(1)
-            elif ch == '2':
-                features.append(2)
-            elif ch == 'X':
-                features.append(-1)
+        return encode_boards([board])[0]
 
-        return features
+    def encode_candidates(self, possible_moves):
+        """
+        Plays each move on the board, takes the canonical form of the result and takes the move back.
+        The moves must be legal (as from get_all_legal_moves): make_move does not check them.
+        Returns the moves, their position keys and their (N, 34) feature array.
+        """
+        board = self.board
+        moves = []
+        keys = []
+        blue = []
+        red = []
+        empties = []
+        for move in possible_moves:
+            board.make_move(*move, self.marker)
 
-    def get_player_move(self):
-        print("DEBUG: AiAgent.get_player_move called")
-        possible_moves = self.get_all_legal_moves()
-        best_score = -float('inf')
-        best_move = None
+            # One canonical form gives both the cache key and the features
+            masks, empty, transform, swapped = canonical_masks(board.masks, board.empty)
+            board.unmake_move(*move, self.marker)
 
-        for move in possible_moves:
-            part, slot, target = move
-            # Work on a copy of the board to avoid corrupting real game state
-            board_copy = copy.deepcopy(self.board)
+            moves.append(move)
+            keys.append(zobrist_hash(masks, empty))
+            blue.append(masks[1])
+            red.append(masks[2])
+            empties.append(empty)
+        return moves, keys, encode_masks(blue, red, empties)
+
+    def predict_scores(self, features):
+        """Scores a (N, 34) feature array with one forward pass of the model"""
+        return np.asarray(self.model(features, training=False)).reshape(-1)
 
-            marker_placed = board_copy.place_marker(part, slot, self.marker)
-            part_moved = board_copy.move_part(part, target)
+    def evaluate(self, keys, features):
+        """Scores of the candidates: cached ones are looked up, the rest share one forward pass"""
+        scores = np.empty(len(keys))
+        missing = []
+        for i, key in enumerate(keys):
+            score = self.cache.get(key)
+            if score is None:
+                missing.append(i)
+            else:
+                scores[i] = score
+        if missing:
+            scores[missing] = self.predict_scores(features[missing])
+            for i in missing:
+                self.cache.put(keys[i], float(scores[i]))
+        return scores
 
-            if not marker_placed or not part_moved:
-                continue  # Skip illegal moves
+    def get_player_move(self):
+        log.debug("AiAgent.get_player_move called")
+        possible_moves = self.get_all_legal_moves()
 
-            # Encode and predict
-            input_array = np.array([self.encode_board(board_copy)], dtype=float)
+        # Score every successor board in a single batch
+        moves, keys, features = self.encode_candidates(possible_moves)
+        if moves:
             try:
-                pred = self.model.predict(input_array, verbose=0)
-                #print(
-                  # f"DEBUG: prediction raw output: {pred}, shape: {getattr(pred, 'shape', type(pred))}")  # Print prediction for debugging
-                score = float(np.array(pred).flatten()[0])  # Guaranteed to work for any shape
+                scores = self.evaluate(keys, features)
+                return moves[int(np.argmax(scores))]
             except Exception as e:
-                print(f"Model prediction error: {e}")
-                continue
-
-            if score > best_score:
-                best_score = score
-                best_move = move
-
-        if best_move is not None:
-            #print("DEBUG: AiAgent returning move:", best_move)
-            return best_move
+                log.warning("Model prediction error: %s", e)
 
-        #print("DEBUG: AiAgent could not generate a valid move!")
         # Fallback: choose any legal move if available, or pass
         return possible_moves[0] if possible_moves else (None, None, None)
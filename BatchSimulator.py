@@ -0,0 +1,142 @@
+import numpy as np
+from Board import PART_BITS, FULL_MASKS, WIN_MASKS
+from MoveGenerator import MOVE_IDS
+from Symmetry import canonical_masks_array
+from BinaryQTable import pack_masks, unpack_keys
+
+# Same grades as Game
+WIN_GRADE = 1.0
+LOSE_GRADE = -1.0
+DRAW_GRADE = 0.0
+
+# Move ids per empty position, padded to 16 columns; MOVE_VALID marks the real ones
+MOVE_TABLE = np.zeros((9, 16), dtype=np.uint64)
+MOVE_VALID = np.zeros((9, 16), dtype=bool)
+for _empty in range(9):
+    MOVE_TABLE[_empty, :len(MOVE_IDS[_empty])] = MOVE_IDS[_empty]
+    MOVE_VALID[_empty, :len(MOVE_IDS[_empty])] = True
+
+# Win windows per empty position, padded with the full board, which can never be filled
+WIN_TABLE = np.full((9, max(len(windows) for windows in WIN_MASKS)), (1 << 36) - 1, dtype=np.uint64)
+for _empty in range(9):
+    WIN_TABLE[_empty, :len(WIN_MASKS[_empty])] = WIN_MASKS[_empty]
+FULL_TABLE = np.array(FULL_MASKS, dtype=np.uint64)
+
+
+def random_policy(rng):
+    """Picks a uniformly random legal move for every game"""
+    def choose(blue, red, empty, player, moves, legal):
+        return np.argmax(np.where(legal, rng.random(legal.shape), -1.0), axis=1)
+    return choose
+
+
+def legal_moves_array(blue, red, empty):
+    """(N, 16) move ids and the (N, 16) mask of those that are legal"""
+    moves = MOVE_TABLE[empty]
+    occupied = ((blue | red)[:, None] >> moves) & np.uint64(1)
+    return moves, MOVE_VALID[empty] & (occupied == 0)
+
+
+def has_window(mask, empty):
+    windows = WIN_TABLE[empty]
+    return ((mask[:, None] & windows) == windows).any(axis=1)
+
+
+def apply_moves(blue, red, empty, player, move):
+    """Places each player's marker on slot bit move, then slides its part into the empty position"""
+    bit = np.uint64(1) << move
+    blue = np.where(player == 1, blue | bit, blue)
+    red = np.where(player == 2, red | bit, red)
+    part = (move // np.uint64(4)).astype(np.int64)
+    part_shift = (4 * part).astype(np.uint64)
+    empty_shift = (4 * empty).astype(np.uint64)
+    blue_nibble = (blue >> part_shift) & np.uint64(PART_BITS)
+    red_nibble = (red >> part_shift) & np.uint64(PART_BITS)
+    blue ^= (blue_nibble << part_shift) | (blue_nibble << empty_shift)
+    red ^= (red_nibble << part_shift) | (red_nibble << empty_shift)
+    return blue, red, part
+
+
+def outcomes(blue, red, empty, player):
+    """
+    Results after player moved, as Game.play_game decides them: (result, over), with
+    result 1 or 2 for the winner and 0 for a tie or a game that goes on
+    """
+    mine = np.where(player == 1, blue, red)
+    theirs = np.where(player == 1, red, blue)
+    mover_wins = has_window(mine, empty)
+    full = (blue | red) == FULL_TABLE[empty]
+    other_wins = ~mover_wins & ~full & has_window(theirs, empty)
+    return np.where(mover_wins, player, np.where(other_wins, 3 - player, 0)), mover_wins | full | other_wins
+
+
+def simulate(num_games, gamma=0.9, policy=None, seed=None, canonical=True):
+    """
+    Plays num_games games at once with NumPy arrays and the rules of Game.play_game:
+    the mover wins with a window of their own, a full board is a tie, a window made
+    only for the opponent by a slide is the opponent's win, and a player without
+    a legal move ends the game in a tie.
+
+    policy(blue, red, empty, player, moves, legal) returns the column of the chosen
+    move for every game still running (random_policy by default).
+    Returns (keys, grades, results): the packed keys (see BinaryQTable) of every
+    position reached, canonical unless canonical is False, their discounted grades
+    as Game.update_grades gives them, and the result of every game (1, 2 or 0 for a tie).
+    """
+    rng = np.random.default_rng(seed)
+    policy = policy or random_policy(rng)
+    blue = np.zeros(num_games, dtype=np.uint64)
+    red = np.zeros(num_games, dtype=np.uint64)
+    empty = np.full(num_games, 4, dtype=np.int64)
+    player = np.ones(num_games, dtype=np.int64)
+    results = np.zeros(num_games, dtype=np.int64)
+    lengths = np.zeros(num_games, dtype=np.int64)
+    running = np.arange(num_games)
+    ply_games = []  # Per ply: the games that moved and the positions they reached
+    ply_positions = []
+
+    while len(running):
+        b, r, e, p = blue[running], red[running], empty[running], player[running]
+        moves, legal = legal_moves_array(b, r, e)
+        stuck = ~legal.any(axis=1)  # No legal move: Game ends in a tie
+        if stuck.any():
+            running = running[~stuck]
+            b, r, e, p, moves, legal = b[~stuck], r[~stuck], e[~stuck], p[~stuck], moves[~stuck], legal[~stuck]
+            if not len(running):
+                break
+
+        move = moves[np.arange(len(running)), policy(b, r, e, p, moves, legal)]
+        b, r, e = apply_moves(b, r, e, p, move)
+        blue[running], red[running], empty[running] = b, r, e
+        lengths[running] += 1
+
+        ply_games.append(running)
+        ply_positions.append((b, r, e))
+
+        results[running], over = outcomes(b, r, e, p)
+        player[running] = 3 - p
+        running = running[~over]
+
+    # Game.update_grades: the last position gets the full grade, each earlier one gamma times less
+    result_grades = np.select([results == 1, results == 2], [WIN_GRADE, LOSE_GRADE], DRAW_GRADE)
+    if not ply_games:
+        return np.empty(0, dtype=np.int64), np.empty(0), results
+    games = np.concatenate(ply_games)
+    plies = np.concatenate([np.full(len(g), ply) for ply, g in enumerate(ply_games)])
+    grades = result_grades[games] * gamma ** (lengths[games] - 1 - plies)
+
+    # Keys of all positions at once
+    positions = [np.concatenate(arrays) for arrays in zip(*ply_positions)]
+    if canonical:
+        positions = canonical_masks_array(*positions)
+    return pack_masks(*positions), grades, results
+
+
+def aggregate(keys, grades):
+    """
+    Folds rows into a QTable shard {key: (grade, count)} with the mean grade of each
+    position, ready for Tournament's merge_tables, SqliteQTable.merge or write_table.
+    """
+    unique, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    means = np.bincount(inverse, weights=grades) / counts
+    return dict(zip((key.decode("ascii") for key in unpack_keys(unique)), zip(means.tolist(), counts.tolist())))
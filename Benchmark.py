@@ -0,0 +1,681 @@
+import contextlib
+import copy
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from Board import Board
+from MoveGenerator import legal_moves
+from SmartAgent import SmartAgent
+from Symmetry import canonical_key
+
+
+def random_positions(count, seed=0):
+    """Collects count positions from random games (as Boards), including repeats"""
+    rng = random.Random(seed)
+    keys = []
+    while len(keys) < count:
+        board = Board()
+        player = 1
+        while not board.winner():
+            moves = legal_moves(board)
+            if not moves:
+                break
+            board.make_move(*rng.choice(moves), player)
+            keys.append(board.str_board_history())
+            player = 2 if player == 1 else 1
+    return [Board.from_history(key) for key in keys[:count]]
+
+
+def timed(function, items):
+    """Runs function over items and returns the seconds it took"""
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    return time.perf_counter() - start
+
+
+def benchmark_canonical(count=20000):
+    """Cost of canonicalising a position and how many keys it saves"""
+    boards = random_positions(count)
+    raw_time = timed(Board.str_board_history, boards)
+    canonical_time = timed(canonical_key, boards)
+    raw_keys = {board.str_board_history() for board in boards}
+    canonical_keys = {canonical_key(board)[0] for board in boards}
+    print(f"=== Canonical keys ({count} positions from random games) ===")
+    print(f"str_board_history: {raw_time / count * 1e6:.2f} us/position")
+    print(f"canonical_key:     {canonical_time / count * 1e6:.2f} us/position")
+    print(f"Distinct keys: {len(raw_keys)} raw, {len(canonical_keys)} canonical "
+          f"({len(raw_keys) / len(canonical_keys):.2f}x fewer)")
+
+
+def benchmark_positions(count=8, seed=1):
+    """A fixed set of undecided positions, 4 to 10 plies into random games"""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board = Board()
+        player = 1
+        for ply in range(rng.randrange(4, 11)):
+            moves = legal_moves(board)
+            if not moves or board.winner():
+                break
+            board.make_move(*rng.choice(moves), player)
+            player = 2 if player == 1 else 1
+        if not board.winner() and legal_moves(board):
+            positions.append((board.str_board_history(), player))
+    return positions
+
+
+def search_nodes(history, player, depth):
+    """Nodes, first-move cutoff rate and seconds SmartAgent needs to pick a move at a fixed depth"""
+    board = Board.from_history(history)
+    agent = SmartAgent(board, player)
+    agent.max_depth = depth
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent.get_player_move()
+    seconds = time.perf_counter() - start
+    return agent.nodes, agent.first_move_cutoffs / max(agent.cutoffs, 1), seconds
+
+
+def benchmark_search_nodes(depths=(3, 4, 5, 6), count=20):
+    """
+    minimax nodes on benchmark_positions. A first-move cutoff rate near 100% means
+    the tree is already close to minimal and move ordering has little to save.
+    """
+    positions = benchmark_positions(count)
+    print(f"=== Search nodes ({len(positions)} positions) ===")
+    for depth in depths:
+        runs = [search_nodes(history, player, depth) for history, player in positions]
+        print(f"depth {depth}: {sum(run[0] for run in runs)} nodes, "
+              f"{sum(run[1] for run in runs) / len(runs):.0%} first-move cutoffs, "
+              f"{sum(run[2] for run in runs):.2f}s")
+
+
+def benchmark_parallel(worker_counts=(1, 2, 4, 8), depth=7, count=4):
+    """Seconds per SmartAgent move with the root moves split over 1, 2, 4 and 8 processes"""
+    # Blue to move in every position, so one agent (and one pool) serves them all
+    positions = [history for history, player in benchmark_positions(4 * count) if player == 1][:count]
+    print(f"=== Parallel root search (depth {depth}, {len(positions)} positions, "
+          f"{os.cpu_count()} CPUs) ===")
+    baseline = None
+    for workers in worker_counts:
+        agent = SmartAgent(Board(), 1, workers=workers)
+        agent.max_depth = depth
+        if workers > 1:
+            agent.get_pool()  # Start the processes before timing
+        seconds = 0
+        for history in positions:
+            agent.board = Board.from_history(history)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                agent.get_player_move()
+            seconds += time.perf_counter() - start
+        agent.close()
+        baseline = baseline or seconds
+        print(f"{workers} worker(s): {seconds / len(positions):.3f}s per move, "
+              f"{baseline / seconds:.2f}x speed-up")
+
+
+def score_one_by_one(agent, possible_moves):
+    """AiAgent's original move choice: one model.predict call per candidate move"""
+    best_score = -float('inf')
+    best_move = None
+    for move in possible_moves:
+        board_copy = Board.from_history(agent.board.str_board_history())
+        board_copy.make_move(*move, agent.marker)
+        score = float(np.array(agent.model.predict(np.array([agent.encode_board(board_copy)], dtype=float),
+                                                   verbose=0)).flatten()[0])
+        if score > best_score:
+            best_score = score
+            best_move = move
+    return best_move
+
+
+def benchmark_ai_batching(count=20):
+    """AiAgent seconds per move: one predict per candidate vs one batched forward pass"""
+    from tensorflow.keras.models import load_model  # Needs TensorFlow and ann_model.keras
+    from AIAgent import AiAgent
+    positions = benchmark_positions(count)
+    agent = AiAgent(Board(), 1)
+    agent.model = load_model("ann_model.keras")
+    single = batched = 0
+    for history, player in positions:
+        agent.board = Board.from_history(history)
+        agent.marker = player
+        moves = agent.get_all_legal_moves()
+        start = time.perf_counter()
+        expected = score_one_by_one(agent, moves)
+        single += time.perf_counter() - start
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            chosen = agent.get_player_move()
+        batched += time.perf_counter() - start
+        if chosen != expected:
+            print(f"Different move for {history}: {chosen} vs {expected}")
+    print(f"=== AiAgent inference ({len(positions)} positions) ===")
+    print(f"one predict per move: {single / len(positions) * 1000:.1f} ms per move")
+    print(f"single batch:         {batched / len(positions) * 1000:.1f} ms per move "
+          f"({single / batched:.1f}x faster)")
+
+
+def encode_with_copies(agent, possible_moves):
+    """AiAgent's original candidate encoding: a deep copy of the board per move"""
+    moves = []
+    rows = []
+    for move in possible_moves:
+        part, slot, target = move
+        board_copy = copy.deepcopy(agent.board)
+        if board_copy.place_marker(part, slot, agent.marker) and board_copy.move_part(part, target):
+            moves.append(move)
+            rows.append(agent.encode_board(board_copy))
+    return moves, np.array(rows, dtype=float).reshape(len(rows), 34)
+
+
+def benchmark_candidate_encoding(count=200):
+    """Time and peak allocated memory per AiAgent decision: deep copies vs make/unmake"""
+    from AIAgent import AiAgent
+    positions = benchmark_positions(count)
+    agent = AiAgent(Board(), 1)
+    encoders = {
+        "deepcopy": lambda moves: encode_with_copies(agent, moves),
+        "make/unmake": agent.encode_candidates,
+    }
+    print(f"=== Candidate encoding ({len(positions)} positions) ===")
+    for name, encode in encoders.items():
+        seconds = peak = 0
+        with contextlib.redirect_stdout(io.StringIO()):
+            for history, player in positions:
+                agent.board = Board.from_history(history)
+                agent.marker = player
+                moves = agent.get_all_legal_moves()
+                start = time.perf_counter()
+                encode(moves)
+                seconds += time.perf_counter() - start
+                tracemalloc.start()
+                encode(moves)
+                peak += tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        print(f"{name}: {seconds / len(positions) * 1e6:.0f} us and "
+              f"{peak / len(positions) / 1024:.1f} KiB peak allocation per decision")
+
+
+def encode_keys_in_python(keys):
+    """NeuronNetwork's original encoding: a dict lookup per character"""
+    char_to_int = {'X': -1, '0': 0, '1': 1, '2': 2}
+    return np.array([[char_to_int[char] for char in key] for key in keys])
+
+
+def benchmark_feature_encoding(count=1000000, board_count=20000):
+    """Keys (and Boards) encoded per second: Python loops vs FeatureEncoder"""
+    from FeatureEncoder import encode_boards, encode_keys
+    boards = random_positions(board_count)
+    distinct = [canonical_key(board)[0] for board in boards]
+    keys = (distinct * (count // len(distinct) + 1))[:count]
+    print(f"=== Feature encoding ({count} keys, {board_count} boards) ===")
+    start = time.perf_counter()
+    expected = encode_keys_in_python(keys)
+    loop_time = time.perf_counter() - start
+    start = time.perf_counter()
+    features = encode_keys(keys)
+    vector_time = time.perf_counter() - start
+    packed = np.array(keys, dtype="S34")
+    start = time.perf_counter()
+    encode_keys(packed)
+    packed_time = time.perf_counter() - start
+    print(f"python loop:        {count / loop_time / 1e6:.2f}M keys/s")
+    print(f"encode_keys (str):  {count / vector_time / 1e6:.2f}M keys/s ({loop_time / vector_time:.0f}x)"
+          f"{'' if np.array_equal(expected, features) else ', DIFFERENT features'}")
+    print(f"encode_keys (S34):  {count / packed_time / 1e6:.2f}M keys/s ({loop_time / packed_time:.0f}x)")
+    start = time.perf_counter()
+    encode_keys_in_python(canonical_key(board)[0] for board in boards)
+    loop_time = time.perf_counter() - start
+    start = time.perf_counter()
+    encode_boards(boards)
+    vector_time = time.perf_counter() - start
+    print(f"boards, key + loop: {board_count / loop_time / 1e3:.0f}k boards/s")
+    print(f"encode_boards:      {board_count / vector_time / 1e3:.0f}k boards/s ({loop_time / vector_time:.1f}x)")
+
+
+LOAD_SCRIPTS = {
+    "keras": "from tensorflow.keras.models import load_model; model = load_model('ann_model.keras')",
+    "numpy": "from NumpyModel import NumpyModel; model = NumpyModel.load('ann_model.npz')",
+}
+
+
+def load_in_subprocess(engine):
+    """Seconds and peak RSS (MB) of a fresh process that imports and loads one engine"""
+    return run_in_subprocess(LOAD_SCRIPTS[engine])
+
+
+def run_in_subprocess(code):
+    """Seconds and peak RSS (MB) of a fresh process that runs code"""
+    # VmHWM (Linux) rather than ru_maxrss, which a child inherits from its parent
+    script = ("import re, time; start = time.perf_counter(); " + code +
+              "; print(time.perf_counter() - start, "
+              "re.search(r'VmHWM:\\s+(\\d+)', open('/proc/self/status').read()).group(1))")
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                            check=True).stdout.split()
+    return float(output[-2]), int(output[-1]) / 1024
+
+
+def benchmark_numpy_inference(batch_sizes=(1, 16, 256), repeats=200):
+    """Keras vs NumpyModel: startup, memory, per-batch latency and largest output difference"""
+    from tensorflow.keras.models import load_model  # Needs TensorFlow and ann_model.keras
+    from NumpyModel import NumpyModel
+    print("=== NumPy inference engine ===")
+    for engine in ("keras", "numpy"):
+        seconds, megabytes = load_in_subprocess(engine)
+        print(f"{engine}: import + load {seconds:.2f}s, peak RSS {megabytes:.0f} MB")
+
+    keras_model = load_model("ann_model.keras")
+    numpy_model = NumpyModel.load("ann_model.npz")
+    rng = np.random.default_rng(0)
+    for batch_size in batch_sizes:
+        features = rng.integers(-1, 3, size=(batch_size, 34)).astype(float)
+        difference = np.abs(np.asarray(keras_model(features, training=False)) - numpy_model(features)).max()
+        keras_time = timed(lambda x: keras_model(x, training=False), [features] * repeats) / repeats
+        numpy_time = timed(numpy_model, [features] * repeats) / repeats
+        print(f"batch {batch_size}: keras {keras_time * 1e6:.0f} us, numpy {numpy_time * 1e6:.0f} us "
+              f"({keras_time / numpy_time:.1f}x), max difference {difference:.1e}")
+
+
+def play_games(count, shared_model):
+    """Seconds for count AiAgent vs RandomPlayer games; without shared_model every game loads the model"""
+    from Game import Game
+    from ModelRegistry import models
+    models.clear()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for game_num in range(count):
+            if not shared_model:
+                models.clear()
+            Game(4, 2, 0.9).play_game()
+    return time.perf_counter() - start
+
+
+@contextlib.contextmanager
+def model_engine(engine):
+    """Runs the block where AiAgent loads the given engine ("numpy" or "keras")"""
+    directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        if engine == "keras":
+            # Only the .keras file, so the registry cannot pick the NumPy export
+            shutil.copy(os.path.join(directory, "ann_model.keras"), workdir)
+            os.chdir(workdir)
+        try:
+            yield
+        finally:
+            os.chdir(directory)
+
+
+def benchmark_model_registry(count=20):
+    """Tournament games per second with one model per game vs one shared per process"""
+    print(f"=== Model registry ({count} AiAgent vs RandomPlayer games) ===")
+    for engine in ("numpy", "keras"):
+        with model_engine(engine):
+            reloading = play_games(count, shared_model=False)
+            shared = play_games(count, shared_model=True)
+        print(f"{engine}: load per game {count / reloading:.1f} games/s, "
+              f"shared model {count / shared:.1f} games/s ({reloading / shared:.1f}x)")
+
+
+def benchmark_evaluation_cache(count=50, capacities=(0, 1 << 10, 1 << 16)):
+    """AiAgent vs RandomPlayer games per second and cache hit rate for several cache capacities"""
+    from Game import Game
+    from ModelRegistry import models
+    print(f"=== Evaluation cache ({count} AiAgent vs RandomPlayer games) ===")
+    for engine in ("numpy", "keras"):
+        baseline = histories = None
+        with model_engine(engine):
+            for capacity in capacities:
+                models.clear()
+                models.cache_size = capacity
+                cache = models.cache()
+                random.seed(0)  # The same RandomPlayer moves for every capacity
+                games = []
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for game_num in range(count):
+                        games.append(Game(4, 2, 0.9).play_game())
+                seconds = time.perf_counter() - start
+                baseline = baseline or seconds
+                histories = histories or games
+                stats = cache.stats()
+                print(f"{engine}, capacity {capacity}: {count / seconds:.1f} games/s "
+                      f"({baseline / seconds:.2f}x), hit rate {stats['hit_rate']:.0%}, "
+                      f"{stats['evictions']} evictions, {'same' if games == histories else 'DIFFERENT'} games")
+    models.clear()
+    models.cache_size = 1 << 16
+
+
+QTABLE_SCRIPTS = {
+    "json": "import json; table = json.load(open('{file}')); [table.get(key) for key in {keys}]",
+    "binary": "from BinaryQTable import BinaryQTable; table = BinaryQTable('{file}'); "
+              "[table.get(key) for key in {keys}]",
+}
+
+
+def benchmark_binary_qtable(count=300000, lookups=1000):
+    """JSON vs binary QTable: save time, file size, and time and peak RSS to open and look up keys"""
+    from BinaryQTable import unpack_keys, write_table
+    from Symmetry import canonical_history
+    rng = np.random.default_rng(0)
+    # Random slot contents and empty positions, canonical like the keys Tournament writes
+    packed = rng.integers(0, 9 * 3 ** 32, size=count, dtype=np.int64)
+    keys = {canonical_history(key.decode())[0] for key in unpack_keys(packed)}
+    table = {key: (float(rng.uniform(-1, 1)), int(rng.integers(1, 100))) for key in keys}
+    sample = rng.choice(list(table), size=lookups).tolist()
+    print(f"=== Binary QTable ({len(table)} entries, {lookups} lookups) ===")
+    with tempfile.TemporaryDirectory() as workdir:
+        files = {"json": os.path.join(workdir, "Board-QTable.json"),
+                 "binary": os.path.join(workdir, "Board-QTable.bin")}
+        start = time.perf_counter()
+        with open(files["json"], "w") as file:
+            json.dump(table, file)
+        save_times = {"json": time.perf_counter() - start}
+        start = time.perf_counter()
+        write_table(files["binary"], table, canonical=True)
+        save_times["binary"] = time.perf_counter() - start
+        for kind, filename in files.items():
+            seconds, megabytes = run_in_subprocess(QTABLE_SCRIPTS[kind].format(file=filename, keys=sample))
+            print(f"{kind}: save {save_times[kind]:.2f}s, {os.path.getsize(filename) / 2 ** 20:.1f} MB, "
+                  f"open + lookups {seconds:.3f}s, peak RSS {megabytes:.0f} MB")
+
+
+def benchmark_qtable_log(table_size=200000, count=50, intervals=(5, 50, 1000)):
+    """Seconds for RandomPlayer games on top of a large QTable, per full-table save interval"""
+    from BinaryQTable import unpack_keys
+    from Tournament import Tournament
+    rng = np.random.default_rng(0)
+    keys = unpack_keys(rng.integers(0, 9 * 3 ** 32, size=table_size, dtype=np.int64))
+    table = {key.decode(): (0.0, 1) for key in keys}
+    print(f"=== QTable delta log ({count} games, {len(table)} entries) ===")
+    directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            for interval in intervals:
+                random.seed(0)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    tournament = Tournament(2, 2, count, 0.9, "Board-QTable.json", compact_every=interval)
+                    tournament.QTable = dict(table)
+                    start = time.perf_counter()
+                    tournament.start_tournament()
+                    seconds = time.perf_counter() - start
+                label = "every 5 games (the old full save)" if interval == 5 else f"every {interval} games"
+                print(f"compact {label}: {seconds:.2f}s, {count / seconds:.1f} games/s")
+        finally:
+            os.chdir(directory)
+
+
+def tournament_in_subprocess(filename, count, seed):
+    """Starts a process that plays count RandomPlayer games into the QTable file"""
+    script = ("import contextlib, io, random; from Tournament import Tournament; "
+              f"random.seed({seed}); tournament = Tournament(2, 2, {count}, 0.9, {filename!r}); "
+              "contextlib.redirect_stdout(io.StringIO()).__enter__(); tournament.start_tournament()")
+    return subprocess.Popen([sys.executable, "-c", script], cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+def benchmark_sqlite_qtable(table_size=200000, count=50, processes=4):
+    """Games per second into a dict + delta log vs SQLite, streaming reads, and concurrent writers"""
+    from BinaryQTable import unpack_keys
+    from SqliteQTable import SqliteQTable
+    from Tournament import Tournament
+    rng = np.random.default_rng(0)
+    keys = unpack_keys(rng.integers(0, 9 * 3 ** 32, size=table_size, dtype=np.int64))
+    table = {key.decode(): (0.0, 1) for key in keys}
+    print(f"=== SQLite QTable ({count} games, {len(table)} entries) ===")
+    with tempfile.TemporaryDirectory() as workdir:
+        for filename in ("Board-QTable.json", "Board-QTable.db"):
+            path = os.path.join(workdir, filename)
+            random.seed(0)
+            with contextlib.redirect_stdout(io.StringIO()):
+                tournament = Tournament(2, 2, count, 0.9, path)
+                if tournament.database is not None:
+                    tournament.database.add_table(table)
+                else:
+                    tournament.QTable = dict(table)
+                start = time.perf_counter()
+                tournament.start_tournament()
+                seconds = time.perf_counter() - start
+            print(f"{filename}: {count / seconds:.1f} games/s")
+
+        database = SqliteQTable(os.path.join(workdir, "Board-QTable.db"))
+        start = time.perf_counter()
+        rows = sum(len(chunk[0]) for chunk in database.chunks())
+        print(f"streaming {rows} rows: {rows / (time.perf_counter() - start) / 1e6:.2f}M rows/s")
+
+        # Several processes add games to one database at the same time
+        path = os.path.join(workdir, "Shared-QTable.db")
+        SqliteQTable(path).close()
+        start = time.perf_counter()
+        workers = [tournament_in_subprocess(path, count, seed) for seed in range(processes)]
+        failed = sum(worker.wait() != 0 for worker in workers)
+        seconds = time.perf_counter() - start
+        shared = SqliteQTable(path)
+        visits = shared.connection.execute("SELECT SUM(count) FROM qtable").fetchone()[0]
+        print(f"{processes} processes x {count} games into one file: {processes * count / seconds:.1f} games/s, "
+              f"{visits} board visits stored, {failed} failed")
+
+
+def benchmark_parallel_tournament(count=400, worker_counts=(1, 2, 4, 8)):
+    """Games per second of RandomPlayer tournaments: serial vs 1, 2, 4 and 8 worker processes"""
+    from Tournament import Tournament
+    print(f"=== Parallel tournament ({count} RandomPlayer games, {os.cpu_count()} CPUs) ===")
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "Board-QTable.json")
+        with contextlib.redirect_stdout(io.StringIO()):
+            tournament = Tournament(2, 2, count, 0.9, path)
+            start = time.perf_counter()
+            tournament.start_tournament()
+            baseline = time.perf_counter() - start
+        print(f"serial: {count / baseline:.1f} games/s")
+        for workers in worker_counts:
+            os.remove(path)
+            with contextlib.redirect_stdout(io.StringIO()):
+                tournament = Tournament(2, 2, count, 0.9, path)
+                seconds = tournament.start_parallel(workers, seed=0)
+            print(f"{workers} worker(s): {count / seconds:.1f} games/s ({baseline / seconds:.2f}x)")
+
+
+def benchmark_quiet_mode(count=500):
+    """RandomPlayer games per second with the game commentary written to a file vs disabled"""
+    from Game import Game
+    from Log import NORMAL, QUIET, verbosity
+    print(f"=== Quiet mode ({count} RandomPlayer games) ===")
+    baseline = None
+    with tempfile.TemporaryFile("w") as output:
+        for name, level in (("normal", NORMAL), ("quiet", QUIET)):
+            random.seed(0)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(output), verbosity(level):
+                for game_num in range(count):
+                    Game(2, 2, 0.9).play_game()
+            seconds = time.perf_counter() - start
+            baseline = baseline or seconds
+            print(f"{name}: {count / seconds:.0f} games/s ({baseline / seconds:.2f}x), "
+                  f"{output.tell() / 2 ** 20:.1f} MB written so far")
+
+
+def benchmark_batch_simulator(count=100000, tournament_games=500):
+    """Games per second: Tournament with two RandomPlayers vs BatchSimulator (rows folded into a shard)"""
+    from BatchSimulator import aggregate, simulate
+    from Tournament import Tournament
+    print(f"=== Batch simulator ({count} games vs {tournament_games} tournament games) ===")
+    with tempfile.TemporaryDirectory() as workdir, tempfile.TemporaryFile("w") as output:
+        for headless in (False, True):
+            with contextlib.redirect_stdout(output):
+                tournament = Tournament(2, 2, tournament_games, 0.9, os.path.join(workdir, f"{headless}.json"),
+                                        headless=headless)
+                baseline = tournament.start_tournament() / tournament_games
+            print(f"Tournament{' (headless)' if headless else ''}: {1 / baseline:.0f} games/s")
+    start = time.perf_counter()
+    keys, grades, results = simulate(count, 0.9, seed=0)
+    simulate_time = time.perf_counter() - start
+    start = time.perf_counter()
+    shard = aggregate(keys, grades)
+    aggregate_time = time.perf_counter() - start
+    seconds = simulate_time + aggregate_time
+    print(f"BatchSimulator: {count / simulate_time:.0f} games/s, {len(keys) / simulate_time / 1e6:.2f}M rows/s; "
+          f"with aggregate ({len(shard)} positions) {count / seconds:.0f} games/s "
+          f"({baseline * count / seconds:.0f}x the headless tournament)")
+    print(f"Results: Blue {np.mean(results == 1):.1%}, Red {np.mean(results == 2):.1%}, "
+          f"ties {np.mean(results == 0):.1%}")
+
+
+def benchmark_environment(num_envs=1024, steps=200):
+    """Random-action environment steps per second: one FourSquaredEnv vs VectorFourSquaredEnv"""
+    from Environment import FourSquaredEnv, VectorFourSquaredEnv
+    rng = np.random.default_rng(0)
+    print(f"=== Environment ({num_envs} vector environments, {steps} steps) ===")
+    env = FourSquaredEnv()
+    observation, info = env.reset()
+    start = time.perf_counter()
+    for step in range(steps):
+        observation, reward, terminated, truncated, info = env.step(rng.choice(np.flatnonzero(info["action_mask"])))
+        if terminated:
+            observation, info = env.reset()
+    single = steps / (time.perf_counter() - start)
+    print(f"FourSquaredEnv:       {single:.0f} steps/s")
+
+    env = VectorFourSquaredEnv(num_envs)
+    observations, info = env.reset()
+    start = time.perf_counter()
+    for step in range(steps):
+        # A random legal action per environment, picked with array operations
+        scores = np.where(info["action_mask"], rng.random(info["action_mask"].shape), -1.0)
+        observations, rewards, terminated, truncated, info = env.step(scores.argmax(axis=1))
+    vector = num_envs * steps / (time.perf_counter() - start)
+    print(f"VectorFourSquaredEnv: {vector:.0f} steps/s ({vector / single:.0f}x)")
+
+
+def check_board(count=300, seed=0):
+    """
+    Regression check for the bit mask Board: str_board_history, is_winner, is_tie and
+    get_empty_places on hand-built positions, and the incremental Zobrist hash and
+    masks through make_move/unmake_move over random games. Raises AssertionError.
+    """
+    from Board import history_to_masks, zobrist_hash
+    print("=== Board check ===")
+    board = Board()
+    assert board.str_board_history() == "0000" * 4 + "XX" + "0000" * 4
+    assert len(board.get_empty_places()) == 32 and ((1, 1), (0, 0)) not in board.get_empty_places()
+    assert not board.is_winner(1) and not board.is_winner(2) and not board.is_tie()
+
+    # One marker each, then the part on the left slid into the centre
+    assert board.place_marker((0, 0), (0, 0), 1) and board.place_marker((2, 2), (1, 1), 2)
+    assert not board.place_marker((0, 0), (0, 0), 2) and not board.place_marker((1, 1), (0, 0), 2)
+    assert board.str_board_history() == "1000" + "0000" * 3 + "XX" + "0000" * 3 + "0002"
+    assert board.get_empty_places()[0] == ((0, 0), (0, 1)) and len(board.get_empty_places()) == 30
+    board.place_marker((1, 0), (0, 1), 1)
+    assert not board.move_part((1, 0), (2, 2)) and board.move_part((1, 0), (1, 1))
+    assert board.str_board_history() == "1000" + "0000" * 2 + "XX" + "0100" + "0000" * 3 + "0002"
+    assert board.board[1][0] is None and ((1, 1), (0, 1)) not in board.get_empty_places()
+    assert ((1, 1), (0, 0)) in board.get_empty_places()
+
+    # A whole part, and a square made of slots of two parts
+    board = Board()
+    for slot_pos in ((0, 0), (0, 1), (1, 0), (1, 1)):
+        board.place_marker((0, 2), slot_pos, 2)
+    assert board.is_winner(2) and not board.is_winner(1) and not board.is_tie()
+    board = Board()
+    for part_pos, slot_pos in (((1, 0), (1, 0)), ((1, 0), (1, 1)), ((2, 0), (0, 0)), ((2, 0), (0, 1))):
+        board.place_marker(part_pos, slot_pos, 1)
+    assert board.is_winner(1) and not board.is_winner(2)
+    assert board.str_board_history() == "0000" * 3 + "0011" + "XX" + "0000" + "1100" + "0000" * 2
+
+    # A full checkerboard of the 6x6 slot grid has no square of one colour: a tie
+    board = Board()
+    for part_pos, slot_pos in board.get_empty_places():
+        row, col = part_pos[0] * 2 + slot_pos[0], part_pos[1] * 2 + slot_pos[1]
+        board.place_marker(part_pos, slot_pos, 1 + (row + col) % 2)
+    assert board.is_full() and board.is_tie() and board.get_empty_places() == []
+    assert not board.is_winner(1) and not board.is_winner(2)
+
+    # Random games: the hash is always the one computed from scratch, and unmake_move
+    # restores the masks, the empty position and the hash
+    rng = random.Random(seed)
+    moves_checked = 0
+    for game in range(count):
+        board = Board()
+        player = 1
+        while not board.winner() and legal_moves(board):
+            before = (list(board.masks), board.empty, board.hash)
+            move = rng.choice(legal_moves(board))
+            board.make_move(*move, player)
+            assert board.hash == zobrist_hash(board.masks, board.empty)
+            assert history_to_masks(board.str_board_history()) == (board.masks, board.empty)
+            board.unmake_move(*move, player)
+            assert (board.masks, board.empty, board.hash) == before
+            board.make_move(*move, player)
+            player = 2 if player == 1 else 1
+            moves_checked += 1
+    print(f"Hand-built positions and {moves_checked} moves of {count} random games: OK")
+
+
+TRAINING_SCRIPTS = {
+    "in-memory": "import json, numpy as np; from Symmetry import canonicalise_table; "
+                 "from FeatureEncoder import encode_keys; from tensorflow.keras.models import load_model; "
+                 "table = canonicalise_table(json.load(open('{file}'))); X = encode_keys(list(table)); "
+                 "y = np.array([value[0] for value in table.values()], dtype=np.float32); "
+                 "load_model('ann_model.keras').fit(X, y, batch_size=64, epochs=1, verbose=0)",
+    "streaming": "from QTableDataset import qtable_dataset; from tensorflow.keras.models import load_model; "
+                 "load_model('ann_model.keras').fit(qtable_dataset('{file}', seed=0), epochs=1, verbose=0)",
+}
+
+
+def benchmark_streaming_training(count=300000):
+    """Seconds and peak RSS of one training epoch on a JSON QTable: loaded into arrays vs streamed"""
+    from BinaryQTable import unpack_keys
+    rng = np.random.default_rng(0)
+    packed = rng.integers(0, 9 * 3 ** 32, size=count, dtype=np.int64)
+    table = {key.decode(): (float(rng.uniform(0, 1)), int(rng.integers(1, 100))) for key in unpack_keys(packed)}
+    print(f"=== Streaming training ({len(table)} entries, 1 epoch) ===")
+    with tempfile.TemporaryDirectory() as workdir:
+        filename = os.path.join(workdir, "Board-QTable.json")
+        with open(filename, "w") as file:
+            json.dump(table, file)
+        del table
+        baseline = run_in_subprocess("import tensorflow; from tensorflow.keras.models import load_model; "
+                                     "load_model('ann_model.keras')")[1]
+        print(f"TensorFlow and the model alone: peak RSS {baseline:.0f} MB")
+        for kind, code in TRAINING_SCRIPTS.items():
+            seconds, megabytes = run_in_subprocess(code.format(file=filename))
+            print(f"{kind}: {seconds:.1f}s, peak RSS {megabytes:.0f} MB ({megabytes - baseline:+.0f} MB)")
+
+
+BENCHMARKS = {
+    "board-check": check_board,
+    "canonical": benchmark_canonical,
+    "search-nodes": benchmark_search_nodes,
+    "parallel": benchmark_parallel,
+    "ai-batching": benchmark_ai_batching,
+    "numpy-inference": benchmark_numpy_inference,
+    "model-registry": benchmark_model_registry,
+    "evaluation-cache": benchmark_evaluation_cache,
+    "candidate-encoding": benchmark_candidate_encoding,
+    "feature-encoding": benchmark_feature_encoding,
+    "binary-qtable": benchmark_binary_qtable,
+    "qtable-log": benchmark_qtable_log,
+    "sqlite-qtable": benchmark_sqlite_qtable,
+    "parallel-tournament": benchmark_parallel_tournament,
+    "quiet-mode": benchmark_quiet_mode,
+    "batch-simulator": benchmark_batch_simulator,
+    "environment": benchmark_environment,
+    "streaming-training": benchmark_streaming_training,
+}
+
+
+if __name__ == "__main__":
+    # Usage: python Benchmark.py [name ...]  (runs every benchmark by default)
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
@@ -0,0 +1,163 @@
+import json
+import sys
+import numpy as np
+from Symmetry import canonicalise_table, canonical_history
+
+# File layout: header, then count int64 keys (sorted), count float32 grades and count uint32 counts
+MAGIC = b"FSQT"
+VERSION = 1
+HEADER = np.dtype([("magic", "S4"), ("version", "<u4"), ("count", "<u8")])
+
+# A key packs the 32 slot characters of a str_board_history key as base-3 digits,
+# plus the empty position: empty * 3**32 + digits, which stays below 2**63
+SLOT_POWERS = 3 ** np.arange(31, -1, -1, dtype=np.int64)
+EMPTY_BASE = 3 ** 32
+
+
+def pack_keys(keys):
+    """Packs str_board_history keys (a list of str or an 'S34' array) into an int64 array"""
+    chars = np.frombuffer(np.asarray(keys, dtype="S34").tobytes(), dtype=np.uint8).reshape(-1, 34)
+    is_empty = chars == ord("X")
+    empty = np.argmax(is_empty, axis=1) // 4  # The XX pair starts at character 4 * empty
+    digits = (chars[~is_empty].reshape(-1, 32) - ord("0")).astype(np.int64)
+    return empty * EMPTY_BASE + digits @ SLOT_POWERS
+
+
+def _build_pack_table():
+    """Base-3 value each part's blue/red nibble pair (blue * 16 + red) adds to a packed key, per empty position"""
+    table = np.zeros((9, 9, 256), dtype=np.int64)
+    for empty in range(9):
+        for index in range(9):
+            if index == empty:
+                continue
+            first = 4 * index if index < empty else 4 * (index - 1)  # Digit of the part's first slot
+            for pair in range(256):
+                blue, red = pair >> 4, pair & 0xF
+                table[empty, index, pair] = sum((((blue >> slot) & 1) + 2 * ((red >> slot) & 1)) * SLOT_POWERS[first + slot]
+                                                for slot in range(4))
+    return table.reshape(-1)
+
+
+PACK_TABLE = _build_pack_table()
+NIBBLE_SHIFTS = 4 * np.arange(9, dtype=np.uint64)
+
+
+def pack_masks(blue, red, empty):
+    """Packs positions given as arrays of blue masks, red masks and empty indices, like pack_keys"""
+    blue = np.asarray(blue, dtype=np.uint64)[:, None]
+    red = np.asarray(red, dtype=np.uint64)[:, None]
+    empty = np.asarray(empty, dtype=np.int64)
+    pairs = (((blue >> NIBBLE_SHIFTS) & np.uint64(0xF)) << np.uint64(4)) | ((red >> NIBBLE_SHIFTS) & np.uint64(0xF))
+    rows = (empty[:, None] * 9 + np.arange(9)) * 256
+    return empty * EMPTY_BASE + np.take(PACK_TABLE, rows + pairs.astype(np.int64)).sum(axis=1)
+
+
+def unpack_keys(packed):
+    """Turns packed keys back into an 'S34' array of str_board_history keys"""
+    packed = np.asarray(packed, dtype=np.int64)
+    empty = packed // EMPTY_BASE
+    digits = ((packed % EMPTY_BASE)[:, None] // SLOT_POWERS) % 3
+    slots = (digits + ord("0")).astype(np.uint8)
+    chars = np.full((len(packed), 34), ord("X"), dtype=np.uint8)
+    columns = np.arange(34)
+    for index in range(9):
+        # Slot characters sit before the XX pair as they are, and after it shifted by 2
+        rows = empty == index
+        keep = (columns < 4 * index) | (columns >= 4 * index + 2)
+        chars[np.ix_(rows, keep)] = slots[rows]
+    return chars.view("S34").reshape(-1)
+
+
+def write_table(filename, table, canonical=False):
+    """
+    Writes a QTable ({key: (grade, count)}) in the binary format. Unless the keys are
+    known to be canonical, symmetric keys are merged first, as Tournament does when it
+    loads a table, so every key in the file is canonical.
+    """
+    if not canonical:
+        table = canonicalise_table(table)
+    keys = pack_keys(list(table.keys())) if table else np.empty(0, dtype=np.int64)
+    order = np.argsort(keys)
+    grades = np.fromiter((value[0] for value in table.values()), dtype=np.float32, count=len(table))
+    counts = np.fromiter((value[1] for value in table.values()), dtype=np.uint32, count=len(table))
+    with open(filename, "wb") as file:
+        file.write(np.array([(MAGIC, VERSION, len(table))], dtype=HEADER).tobytes())
+        file.write(keys[order].astype("<i8").tobytes())
+        file.write(grades[order].astype("<f4").tobytes())
+        file.write(counts[order].astype("<u4").tobytes())
+
+
+class BinaryQTable:
+    """
+    Read-only QTable in the binary format, opened with numpy.memmap: nothing is read
+    until it is used, and a lookup is a binary search over the sorted keys.
+    """
+    def __init__(self, filename="Board-QTable.bin"):
+        header = np.fromfile(filename, dtype=HEADER, count=1)
+        if len(header) != 1 or header["magic"][0] != MAGIC or header["version"][0] != VERSION:
+            raise ValueError(f"{filename} is not a binary QTable")
+        count = int(header["count"][0])
+        self.keys = self.open_array(filename, "<i8", HEADER.itemsize, count)
+        self.grades = self.open_array(filename, "<f4", HEADER.itemsize + 8 * count, count)
+        self.counts = self.open_array(filename, "<u4", HEADER.itemsize + 12 * count, count)
+
+    @staticmethod
+    def open_array(filename, dtype, offset, count):
+        # numpy.memmap cannot map an empty array
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(filename, dtype=dtype, mode="r", offset=offset, shape=(count,))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find(self, key):
+        """Index of a str_board_history key (canonicalised first) in the table, or -1"""
+        packed = pack_keys([canonical_history(key)[0]])[0]
+        index = int(np.searchsorted(self.keys, packed))
+        return index if index < len(self.keys) and self.keys[index] == packed else -1
+
+    def __contains__(self, key):
+        return self.find(key) >= 0
+
+    def get(self, key, default=None):
+        """Returns (grade, count) of the position, or default"""
+        index = self.find(key)
+        if index < 0:
+            return default
+        return float(self.grades[index]), int(self.counts[index])
+
+    def chunks(self, size=1 << 16):
+        """Yields (keys as an 'S34' array, grades, counts) for consecutive slices of the table"""
+        for start in range(0, len(self.keys), size):
+            stop = start + size
+            yield unpack_keys(self.keys[start:stop]), np.array(self.grades[start:stop]), np.array(self.counts[start:stop])
+
+    def to_dict(self):
+        table = {}
+        for keys, grades, counts in self.chunks():
+            table.update(zip((key.decode("ascii") for key in keys), zip(grades.tolist(), counts.tolist())))
+        return table
+
+
+def json_to_binary(json_file="Board-QTable.json", binary_file="Board-QTable.bin"):
+    with open(json_file, "r") as file:
+        table = json.load(file)
+    write_table(binary_file, table)
+    print(f"Converted {len(table)} entries from {json_file} to {binary_file}")
+
+
+def binary_to_json(binary_file="Board-QTable.bin", json_file="Board-QTable.json"):
+    table = BinaryQTable(binary_file).to_dict()
+    with open(json_file, "w") as file:
+        json.dump(table, file)
+    print(f"Converted {len(table)} entries from {binary_file} to {json_file}")
+
+
+if __name__ == "__main__":
+    # Usage: python BinaryQTable.py Board-QTable.json Board-QTable.bin  (or the other way round)
+    source, target = sys.argv[1:3] if len(sys.argv) > 2 else ("Board-QTable.json", "Board-QTable.bin")
+    if source.endswith(".json"):
+        json_to_binary(source, target)
+    else:
+        binary_to_json(source, target)
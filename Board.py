@@ -1,28 +1,202 @@
 import numpy as np
+import random
+from Log import log
+
+# Bit layout shared by both colour masks: grid position index = row * 3 + col owns
+# the nibble starting at bit 4 * index, and slot (slot_row, slot_col) of that part is
+# bit slot_row * 2 + slot_col inside the nibble. The empty position always holds 0000.
+PART_BITS = 0xF
+ALL_SLOTS = (1 << 36) - 1
+
+# Mask of the 32 slots that exist for each empty position
+FULL_MASKS = [ALL_SLOTS & ~(PART_BITS << (4 * index)) for index in range(9)]
+
+# ((part_row, part_col), (slot_row, slot_col)) for every bit, in get_empty_places order
+PLACES = [((bit // 4 // 3, bit // 4 % 3), (bit % 4 // 2, bit % 2)) for bit in range(36)]
+
+
+def slot_index(part_pos, slot_pos):
+    """Returns the bit index of a slot"""
+    return 4 * (part_pos[0] * 3 + part_pos[1]) + slot_pos[0] * 2 + slot_pos[1]
+
+
+def _build_win_windows():
+    """Every 2x2 square of the 6x6 slot grid, as a bit mask"""
+    windows = []
+    for row in range(5):
+        for col in range(5):
+            mask = 0
+            for r in (row, row + 1):
+                for c in (col, col + 1):
+                    mask |= 1 << (4 * ((r // 2) * 3 + c // 2) + (r % 2) * 2 + c % 2)
+            windows.append(mask)
+    return windows
+
+
+WIN_WINDOWS = _build_win_windows()
+
+# Winning windows for each empty position: windows that overlap the empty part can
+# never be filled, so a win check only has to test the remaining ones
+WIN_MASKS = [tuple(window for window in WIN_WINDOWS if not window & (PART_BITS << (4 * index)))
+             for index in range(9)]
+
+# Zobrist keys: one random 64-bit number per (marker, bit) and per empty position.
+# The generator is seeded so hashes are the same in every process and run.
+_zobrist_random = random.Random(4222)
+ZOBRIST = [[0] * 36] + [[_zobrist_random.getrandbits(64) for bit in range(36)] for marker in (1, 2)]
+ZOBRIST_EMPTY = [_zobrist_random.getrandbits(64) for index in range(9)]
+
+
+def _build_zobrist_parts():
+    """XOR of the keys of every marker in a part nibble, per marker, grid index and
+    nibble value, so sliding a part updates the hash with a few lookups"""
+    parts = [[[0] * 16 for index in range(9)]]
+    for marker in (1, 2):
+        by_index = []
+        for index in range(9):
+            by_nibble = []
+            for nibble in range(16):
+                key = 0
+                for slot in range(4):
+                    if (nibble >> slot) & 1:
+                        key ^= ZOBRIST[marker][4 * index + slot]
+                by_nibble.append(key)
+            by_index.append(by_nibble)
+        parts.append(by_index)
+    return parts
+
+
+ZOBRIST_PARTS = _build_zobrist_parts()
+
+
+def zobrist_hash(masks, empty):
+    """Computes the Zobrist hash of a position from scratch"""
+    key = ZOBRIST_EMPTY[empty]
+    for marker in (1, 2):
+        for index in range(9):
+            key ^= ZOBRIST_PARTS[marker][index][(masks[marker] >> (4 * index)) & PART_BITS]
+    return key
+
+
+def history_to_masks(history):
+    """
+    Parses a str_board_history key back into ([0, blue_mask, red_mask], empty_index).
+    """
+    masks = [0, 0, 0]
+    empty = None
+    pos = 0
+    for index in range(9):
+        if history[pos] == "X":
+            empty = index
+            pos += 2
+            continue
+        for slot in range(4):
+            value = history[pos]
+            if value != "0":
+                masks[int(value)] |= 1 << (4 * index + slot)
+            pos += 1
+    if empty is None or pos != len(history):
+        raise ValueError(f"Invalid board key: {history}")
+    return masks, empty
+
+
+def _nibble_chars(blue, red):
+    return "".join("1" if (blue >> slot) & 1 else "2" if (red >> slot) & 1 else "0" for slot in range(4))
+
+
+# The 4 history characters of a part, indexed by [blue nibble][red nibble]
+NIBBLE_CHARS = [[_nibble_chars(blue, red) for red in range(16)] for blue in range(16)]
+
+
+def masks_to_history(masks, empty):
+    """
+    Builds the str_board_history key of a position: 4 characters per part
+    (0 - Empty, 1 - Blue, 2 - Red) and XX for the empty position.
+    """
+    blue, red = masks[1], masks[2]
+    history = []
+    for index in range(9):
+        if index == empty:
+            history.append("XX")  # Use XX to represent the None spot
+        else:
+            shift = 4 * index
+            history.append(NIBBLE_CHARS[(blue >> shift) & PART_BITS][(red >> shift) & PART_BITS])
+    return "".join(history)
+
+
+def history_hash(history):
+    """Zobrist hash of a str_board_history key, without building a Board"""
+    masks, empty = history_to_masks(history)
+    return zobrist_hash(masks, empty)
+
+
+class slotRow:
+    """One row of a boardPart's slots, read and written straight through the board masks"""
+    def __init__(self, board, index, slot_row):
+        self.board = board
+        self.shift = 4 * index + slot_row * 2
+
+    def __getitem__(self, slot_col):
+        bit = 1 << (self.shift + slot_col)
+        if self.board.masks[1] & bit:
+            return 1
+        if self.board.masks[2] & bit:
+            return 2
+        return 0
+
+    def __setitem__(self, slot_col, value):
+        board = self.board
+        index = self.shift + slot_col
+        bit = 1 << index
+        for marker in (1, 2):
+            if board.masks[marker] & bit:
+                board.masks[marker] &= ~bit
+                board.hash ^= ZOBRIST[marker][index]
+        if value:
+            board.masks[value] |= bit
+            board.hash ^= ZOBRIST[value][index]
+
 
 class boardPart:
-    def __init__(self):
-        self.slots = [
-            [0, 0],
-            [0, 0]
-        ] # 0 - Empty, 1 - Blue, 2 - Red
+    """View of the part at one grid position of a Board.
+    slots[row][col] keeps the old 0 - Empty, 1 - Blue, 2 - Red interface"""
+    def __init__(self, board, index):
+        self.board = board
+        self.index = index
+
+    @property
+    def slots(self):
+        return [slotRow(self.board, self.index, 0), slotRow(self.board, self.index, 1)]
 
     def is_full(self):
-        for row in range(2):
-            for col in range(2):
-                if self.slots[row][col] == 0:
-                    return False
-        return True
+        filled = self.board.masks[1] | self.board.masks[2]
+        return (filled >> (4 * self.index)) & PART_BITS == PART_BITS
 
 
 class Board:
     def __init__(self):
+        self.masks = [0, 0, 0]  # indexed by marker: 1 - Blue, 2 - Red (0 unused)
+        self.empty = 4  # grid index (row * 3 + col) of the missing part
+        self.hash = ZOBRIST_EMPTY[4]  # Zobrist hash, kept up to date by every change
+        self.parts = [boardPart(self, index) for index in range(9)]
         self.board = [
-            [boardPart(), boardPart(), boardPart()],
-            [boardPart() ,None, boardPart() ],
-            [boardPart(), boardPart(), boardPart()]
+            [self.parts[0], self.parts[1], self.parts[2]],
+            [self.parts[3], None, self.parts[5]],
+            [self.parts[6], self.parts[7], self.parts[8]]
         ]
 
+    @classmethod
+    def from_history(cls, history):
+        """Builds a Board from a str_board_history key (e.g. a QTable key)"""
+        board = cls()
+        masks, empty = history_to_masks(history)
+        board.masks = masks
+        board.board[1][1] = board.parts[4]
+        board.board[empty // 3][empty % 3] = None
+        board.empty = empty
+        board.hash = zobrist_hash(masks, empty)
+        return board
+
     def print_board(self):
         for row in self.board:
             if None not in row:
@@ -52,11 +226,11 @@ class Board:
         row_new, col_new = new_pos
 
         if row_pos < 0 or row_pos > 2 or col_pos < 0 or col_pos > 2:
-            print("Move invalid")
+            log.debug("Move invalid")
             return False
 
         if row_new < 0 or row_new > 2 or col_new < 0 or col_new > 2:
-            print("Move invalid")
+            log.debug("Move invalid")
             return False
 
         if (row_pos == row_new and abs(col_pos - col_new) == 1):
@@ -76,20 +250,20 @@ player: 1 for Blue, 2 for Red"""
         row_slot, col_slot = slot_pos
 
         # Check if part exists
-        if self.board[row_part][col_part] is None:
-            print("Part is None")
+        if row_part * 3 + col_part == self.empty:
+            log.debug("Part is None")
             return False
 
-        # Get the board part
-        part = self.board[row_part][col_part]
-
         # Check if slot is empty
-        if part.slots[row_slot][col_slot] != 0:
-            print("Slot is occupied")
+        index = slot_index(part_pos, slot_pos)
+        bit = 1 << index
+        if (self.masks[1] | self.masks[2]) & bit:
+            log.debug("Slot is occupied")
             return False
 
         # Make the move
-        part.slots[row_slot][col_slot] = player
+        self.masks[player] |= bit
+        self.hash ^= ZOBRIST[player][index]
         return True  # Return True for successful placement
 
     def move_part(self, part_pos, target_pos):  # part 2 of submit move
@@ -97,25 +271,58 @@ player: 1 for Blue, 2 for Red"""
         row_target, col_target = target_pos
 
         # Check if part exists
-        if self.board[row_part][col_part] is None:
-            print("Part is None")
+        if row_part * 3 + col_part == self.empty:
+            log.debug("Part is None")
             return False
 
         # Check if target position is empty
-        if self.board[row_target][col_target] is not None:
-            print("Target position is not empty")
+        if row_target * 3 + col_target != self.empty:
+            log.debug("Target position is not empty")
             return False
 
         # Check if part can move to target position
         if not self.can_part_move(part_pos, target_pos):
-            print(f"Part cannot move from {part_pos} to {target_pos}")
+            log.debug("Part cannot move from %s to %s", part_pos, target_pos)
             return False
 
         # Move the part
-        self.board[row_target][col_target] = self.board[row_part][col_part]
-        self.board[row_part][col_part] = None
+        self.slide(row_part * 3 + col_part)
         return True
 
+    def slide(self, index):
+        """Slides the part at grid index into the empty position, O(1)"""
+        empty = self.empty
+        shift = 4 * index
+        empty_shift = 4 * empty
+        masks = self.masks
+        key = self.hash ^ ZOBRIST_EMPTY[empty] ^ ZOBRIST_EMPTY[index]
+        for marker in (1, 2):
+            nibble = (masks[marker] >> shift) & PART_BITS
+            masks[marker] ^= (nibble << shift) | (nibble << empty_shift)
+            key ^= ZOBRIST_PARTS[marker][index][nibble] ^ ZOBRIST_PARTS[marker][empty][nibble]
+        self.hash = key
+        self.board[empty // 3][empty % 3] = self.parts[empty]
+        self.board[index // 3][index % 3] = None
+        self.empty = index
+
+    def make_move(self, part_pos, slot_pos, target_pos, player):
+        """
+        Places player's marker and slides the part into target_pos in constant time.
+        Unlike place_marker/move_part the move is not validated, so it must be legal
+        (empty slot, target_pos is the empty position next to part_pos).
+        """
+        index = slot_index(part_pos, slot_pos)
+        self.masks[player] |= 1 << index
+        self.hash ^= ZOBRIST[player][index]
+        self.slide(part_pos[0] * 3 + part_pos[1])
+
+    def unmake_move(self, part_pos, slot_pos, target_pos, player):
+        """Reverts make_move with the same arguments in constant time"""
+        self.slide(target_pos[0] * 3 + target_pos[1])
+        index = slot_index(part_pos, slot_pos)
+        self.masks[player] &= ~(1 << index)
+        self.hash ^= ZOBRIST[player][index]
+
 
 
     def is_winner(self, player):
@@ -124,83 +331,32 @@ player: 1 for Blue, 2 for Red"""
                 This can happen in two ways:
                 1. A single BoardPart is completely filled with the player's markers
                 2. Adjacent BoardParts form a 2x2 square of the player's markers
+                Both are 2x2 windows of the slot grid, looked up in WIN_MASKS.
                 """
-        # Check if any BoardPart is completely filled with player's markers
-        for row in range(3):
-            for col in range(3):
-                part = self.board[row][col]
-                if part is not None:
-                    if (part.slots[0][0] == player and
-                            part.slots[0][1] == player and
-                            part.slots[1][0] == player and
-                            part.slots[1][1] == player):
-                        return True
-
-        # Check for 2x2 squares across adjacent BoardParts
-        # We need to check the edges between parts
-
-        # Check horizontal adjacency (right side of one part, left side of adjacent part)
-        for row in range(3):
-            for col in range(2):  # Only check columns 0 and 1 since we need column+1
-                left_part = self.board[row][col]
-                right_part = self.board[row][col + 1]
-
-                if left_part is not None and right_part is not None:
-                    # Check top edge
-                    if (left_part.slots[0][1] == player and  # Top-right of left part
-                            right_part.slots[0][0] == player and  # Top-left of right part
-                            left_part.slots[1][1] == player and  # Bottom-right of left part
-                            right_part.slots[1][0] == player):  # Bottom-left of right part
-                        return True
-
-        # Check vertical adjacency (bottom side of one part, top side of part below)
-        for row in range(2):  # Only check rows 0 and 1 since we need row+1
-            for col in range(3):
-                top_part = self.board[row][col]
-                bottom_part = self.board[row + 1][col]
-
-                if top_part is not None and bottom_part is not None:
-                    # Check left edge
-                    if (top_part.slots[1][0] == player and  # Bottom-left of top part
-                            bottom_part.slots[0][0] == player and  # Top-left of bottom part
-                            top_part.slots[1][1] == player and  # Bottom-right of top part
-                            bottom_part.slots[0][1] == player):  # Top-right of bottom part
-                        return True
-
-        # Check diagonal adjacency (corner of 4 different parts)
-        for row in range(2):
-            for col in range(2):
-                top_left = self.board[row][col]
-                top_right = self.board[row][col + 1]
-                bottom_left = self.board[row + 1][col]
-                bottom_right = self.board[row + 1][col + 1]
-
-                if (top_left is not None and top_right is not None and
-                        bottom_left is not None and bottom_right is not None):
-                    if (top_left.slots[1][1] == player and  # Bottom-right of top-left part
-                            top_right.slots[1][0] == player and  # Bottom-left of top-right part
-                            bottom_left.slots[0][1] == player and  # Top-right of bottom-left part
-                            bottom_right.slots[0][0] == player):  # Top-left of bottom-right part
-                        return True
-
+        mask = self.masks[player]
+        for window in WIN_MASKS[self.empty]:
+            if mask & window == window:
+                return True
         return False
 
+    def winner(self):
+        """Returns 1 or 2 if that player has a winning square, otherwise 0.
+        Both colours are checked in a single pass over the win masks; if a slide
+        completed squares for both, Blue is reported like is_winner(1) first."""
+        blue, red = self.masks[1], self.masks[2]
+        result = 0
+        for window in WIN_MASKS[self.empty]:
+            if blue & window == window:
+                return 1
+            if red & window == window:
+                result = 2
+        return result
+
     def is_full(self):
-        for row in range(3):
-            for col in range(3):
-                part = self.board[row][col]
-                # Skip the None in the middle
-                if part is None:
-                    continue
-                # Check if any slot in this BoardPart is empty
-                for slot_row in range(2):
-                    for slot_col in range(2):
-                        if part.slots[slot_row][slot_col] == 0:
-                            return False
-        return True
+        return self.masks[1] | self.masks[2] == FULL_MASKS[self.empty]
 
     def is_tie(self):
-        if self.is_full() and not self.is_winner(2) and not self.is_winner(1):
+        if self.is_full() and not self.winner():
             return True
         return False
 
@@ -209,19 +365,8 @@ player: 1 for Blue, 2 for Red"""
         Returns a list of empty slots as tuples: ((board_row, board_col), (slot_row, slot_col))
         Each tuple represents a position where a player can place their marker.
         """
-        empty_places = []
-        for board_row in range(3):
-            for board_col in range(3):
-                part = self.board[board_row][board_col]
-                # Skip the None in the middle
-                if part is None:
-                    continue
-                # Check each slot in this BoardPart
-                for slot_row in range(2):
-                    for slot_col in range(2):
-                        if part.slots[slot_row][slot_col] == 0:
-                            empty_places.append(((board_row, board_col), (slot_row, slot_col)))
-        return empty_places
+        occupied = self.masks[1] | self.masks[2] | (PART_BITS << (4 * self.empty))
+        return [PLACES[bit] for bit in range(36) if not (occupied >> bit) & 1]
 
     def get_str_board(self):
         """
@@ -264,18 +409,4 @@ player: 1 for Blue, 2 for Red"""
         Returns a compact string representation of the board without newlines,
         suitable for storing in game history.
         """
-        history_str = ""
-
-        # Loop through each row of BoardParts
-        for board_row in range(3):
-            for board_col in range(3):
-                part = self.board[board_row][board_col]
-                if part is None:
-                    history_str += "XX"  # Use XX to represent the None spot
-                else:
-                    for slot_row in range(2):
-                        for slot_col in range(2):
-                            value = part.slots[slot_row][slot_col]
-                            history_str += str(value)
-
-        return history_str
+        return masks_to_history(self.masks, self.empty)
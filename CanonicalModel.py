@@ -0,0 +1,33 @@
+import numpy as np
+from BatchSimulator import simulate
+from BinaryQTable import unpack_keys
+from FeatureEncoder import encode_keys
+from NumpyModel import export_keras_model
+from Log import log
+
+
+def retrain_canonical(model_file="ann_model.keras", games=20000, epochs=5, batch_size=64, seed=0):
+    """
+    Retrains a model on canonical features, the input AiAgent, NeuronNetwork and
+    SelfPlay use, for models trained on raw str_board_history keys. The data is the
+    mean discounted grade of every canonical position of games between random players
+    (BatchSimulator). Training starts from the model's own weights and optimizer.
+    Saves the .keras file and its .npz export, and returns the final training loss.
+    """
+    from tensorflow.keras.models import load_model
+    keys, grades, results = simulate(games, seed=seed)
+    unique, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    features = encode_keys(unpack_keys(unique))
+    targets = (np.bincount(inverse, weights=grades) / counts).astype(np.float32)
+    log.info("Retraining %s on %s canonical positions from %s games", model_file, len(unique), games)
+    model = load_model(model_file)
+    history = model.fit(features, targets, epochs=epochs, batch_size=batch_size, validation_split=0.1, verbose=0)
+    model.save(model_file)
+    export_keras_model(model, model_file.replace(".keras", ".npz"))
+    return history.history["loss"][-1]
+
+
+if __name__ == "__main__":
+    # Usage: python CanonicalModel.py [ann_model.keras]
+    import sys
+    retrain_canonical(sys.argv[1] if len(sys.argv) > 1 else "ann_model.keras")
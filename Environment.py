@@ -0,0 +1,131 @@
+import numpy as np
+from BatchSimulator import MOVE_TABLE, MOVE_VALID, legal_moves_array, apply_moves, outcomes
+from FeatureEncoder import encode_masks
+from Symmetry import canonical_masks_array
+
+# Fixed action space: every (part, slot, target) triple, part and target as grid
+# indices (row * 3 + col) and slot as slot_row * 2 + slot_col
+ACTION_COUNT = 9 * 4 * 9
+
+
+def action_index(part_pos, slot_pos, target_pos):
+    """Action number of a (part_pos, slot_pos, target_pos) move"""
+    part = part_pos[0] * 3 + part_pos[1]
+    slot = slot_pos[0] * 2 + slot_pos[1]
+    return (part * 4 + slot) * 9 + target_pos[0] * 3 + target_pos[1]
+
+
+def action_move(action):
+    """(part_pos, slot_pos, target_pos) of an action number"""
+    part, slot, target = action // 36, action // 9 % 4, action % 9
+    return (part // 3, part % 3), (slot // 2, slot % 2), (target // 3, target % 3)
+
+
+# Action of every column of MOVE_TABLE: a move id is part * 4 + slot and its target is the empty position
+ACTION_TABLE = (MOVE_TABLE.astype(np.int64) * 9 + np.arange(9)[:, None]) * MOVE_VALID
+
+
+class VectorFourSquaredEnv:
+    """
+    num_envs games stepped in lockstep on NumPy arrays (see BatchSimulator), with the
+    rules of Game.play_game. Observations are the (num_envs, 34) network features of
+    the boards; info carries the legal-action mask, the side to move and the result of
+    games that just ended. Rewards are for the player who moved: 1 for a win, -1 for
+    a loss, 0 otherwise. With autoreset a finished game starts over at once: the
+    returned observation and mask are the new game's, and info["final_observation"]
+    holds the boards the games ended on.
+
+    Observations, actions and action masks all refer to the board as played.
+    canonical=True gives the features of the canonical form of each board instead, the
+    input the value network is trained on and AiAgent feeds it; those observations are
+    in a different orientation from the actions and masks.
+    """
+    def __init__(self, num_envs, autoreset=True, canonical=False):
+        self.num_envs = num_envs
+        self.autoreset = autoreset
+        self.canonical = canonical
+        self.blue = np.zeros(num_envs, dtype=np.uint64)
+        self.red = np.zeros(num_envs, dtype=np.uint64)
+        self.empty = np.full(num_envs, 4, dtype=np.int64)
+        self.player = np.ones(num_envs, dtype=np.int64)
+        self.done = np.zeros(num_envs, dtype=bool)
+        self.rows = np.arange(num_envs)
+
+    def reset(self, seed=None, envs=None):
+        """Starts the games in envs (all by default) from the empty board. The game has no randomness, so seed is unused."""
+        envs = self.rows if envs is None else envs
+        self.blue[envs] = 0
+        self.red[envs] = 0
+        self.empty[envs] = 4
+        self.player[envs] = 1
+        self.done[envs] = False
+        return self.observations(), self.info(np.zeros(self.num_envs, dtype=np.int64))
+
+    def observations(self):
+        if self.canonical:
+            return encode_masks(*canonical_masks_array(self.blue, self.red, self.empty))
+        return encode_masks(self.blue, self.red, self.empty)
+
+    def action_masks(self):
+        """(num_envs, ACTION_COUNT) mask of the legal actions (none for finished games)"""
+        moves, legal = legal_moves_array(self.blue, self.red, self.empty)
+        masks = np.zeros((self.num_envs, ACTION_COUNT), dtype=bool)
+        masks[self.rows[:, None], ACTION_TABLE[self.empty]] = legal & ~self.done[:, None]
+        return masks
+
+    def info(self, results):
+        return {"action_mask": self.action_masks(), "player": self.player.copy(), "result": results}
+
+    def step(self, actions):
+        """
+        Plays one action per game (finished games ignore theirs when autoreset is off).
+        Returns (observations, rewards, terminated, truncated, info).
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        active = ~self.done
+        legal = self.action_masks()[self.rows, actions]
+        if not legal[active].all():
+            raise ValueError(f"Illegal actions in environments {np.flatnonzero(active & ~legal).tolist()}")
+
+        move = (actions // 9).astype(np.uint64)
+        blue, red, empty = apply_moves(self.blue, self.red, self.empty, self.player, move)
+        results, over = outcomes(blue, red, empty, self.player)
+        self.blue = np.where(active, blue, self.blue)
+        self.red = np.where(active, red, self.red)
+        self.empty = np.where(active, empty, self.empty)
+        results = np.where(active, results, 0)
+        terminated = active & over
+        rewards = np.where(results == self.player, 1.0, np.where(results == 3 - self.player, -1.0, 0.0))
+        self.player = np.where(active & ~over, 3 - self.player, self.player)
+        self.done |= terminated
+
+        # A player left without a legal move ends the game in a tie
+        stuck = ~self.done & ~legal_moves_array(self.blue, self.red, self.empty)[1].any(axis=1)
+        terminated |= stuck
+        self.done |= stuck
+
+        final_observations = None
+        if self.autoreset and terminated.any():
+            final_observations = self.observations()
+            self.reset(envs=np.flatnonzero(terminated))
+        info = self.info(results)
+        if final_observations is not None:
+            info["final_observation"] = final_observations
+        return self.observations(), rewards, terminated, np.zeros(self.num_envs, dtype=bool), info
+
+
+class FourSquaredEnv:
+    """A single game with the same reset()/step(action) interface, on top of VectorFourSquaredEnv"""
+    def __init__(self, canonical=False):
+        self.env = VectorFourSquaredEnv(1, autoreset=False, canonical=canonical)
+
+    def reset(self, seed=None):
+        observations, info = self.env.reset(seed)
+        return observations[0], {key: value[0] for key, value in info.items()}
+
+    def step(self, action):
+        if self.env.done[0]:
+            raise ValueError("The game is over, call reset()")
+        observations, rewards, terminated, truncated, info = self.env.step([action])
+        return (observations[0], float(rewards[0]), bool(terminated[0]), bool(truncated[0]),
+                {key: value[0] for key, value in info.items()})
@@ -0,0 +1,87 @@
+import os
+from collections import OrderedDict
+import numpy as np
+from Log import log
+
+
+class EvaluationCache:
+    """
+    Least-recently-used map from a position hash to the network's score for it.
+    Holds at most capacity entries (0 turns the cache off); looking a position up
+    marks it as recently used, and a store into a full cache evicts the oldest entry.
+    The scores belong to one model, so a cache must be dropped when its model changes.
+    """
+    def __init__(self, capacity=1 << 16):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Returns the cached score of the position, or None"""
+        score = self.entries.get(key)
+        if score is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return score
+
+    def put(self, key, score):
+        if self.capacity <= 0:
+            return
+        self.entries[key] = score
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, capacity):
+        """Changes the capacity, evicting the oldest entries that no longer fit"""
+        self.capacity = capacity
+        while len(self.entries) > max(capacity, 0):
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries = OrderedDict()
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "evictions": self.evictions,
+            "size": len(self.entries),
+            "capacity": self.capacity,
+        }
+
+    def save(self, filename="evaluation_cache.npz"):
+        """Saves the entries, oldest first, so warm restores their order"""
+        keys = np.fromiter(self.entries.keys(), dtype=np.uint64, count=len(self.entries))
+        scores = np.fromiter(self.entries.values(), dtype=np.float32, count=len(self.entries))
+        np.savez(filename, keys=keys, scores=scores)
+        log.info("Saved %s evaluations to %s", len(keys), filename)
+
+    def warm(self, filename="evaluation_cache.npz"):
+        """Fills the cache from a file written by save (made with the same model)"""
+        if not os.path.exists(filename):
+            log.info("File %s not found. Starting with an empty evaluation cache", filename)
+            return 0
+        with np.load(filename) as data:
+            keys, scores = data["keys"], data["scores"]
+        for key, score in zip(keys.tolist(), scores.tolist()):
+            self.put(key, score)
+        log.info("Loaded %s evaluations from %s", len(keys), filename)
+        return len(keys)
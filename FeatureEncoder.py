@@ -0,0 +1,58 @@
+import numpy as np
+from Symmetry import canonical_masks
+
+# Network input of each str_board_history character: 0 - Empty, 1 - Blue, 2 - Red, -1 - the empty position
+CHAR_VALUES = np.zeros(256, dtype=np.float32)
+for _char, _value in (("0", 0), ("1", 1), ("2", 2), ("X", -1)):
+    CHAR_VALUES[ord(_char)] = _value
+
+
+def _key_bits(empty):
+    """Slot bit behind each of the 34 key characters for an empty position (-1 for the XX pair)"""
+    bits = []
+    for index in range(9):
+        bits.extend([-1, -1] if index == empty else range(4 * index, 4 * index + 4))
+    return bits
+
+
+# Per empty position, the slot bit of every feature column (-1 marks the empty position)
+KEY_BITS = np.array([_key_bits(empty) for empty in range(9)], dtype=np.int64)
+SLOT_SHIFTS = np.arange(36, dtype=np.uint64)
+
+
+def encode_keys(keys):
+    """
+    Encodes str_board_history keys into an (N, 34) float32 feature array.
+    keys may be a list of str or bytes, or a NumPy array of 34-byte strings ('S34').
+    """
+    if isinstance(keys, np.ndarray):
+        buffer = np.ascontiguousarray(keys, dtype="S34").tobytes()
+    else:
+        buffer = "".join(keys).encode("ascii") if keys and isinstance(keys[0], str) else b"".join(keys)
+    return CHAR_VALUES[np.frombuffer(buffer, dtype=np.uint8).reshape(-1, 34)]
+
+
+def encode_masks(blue, red, empty):
+    """
+    Encodes positions given as arrays of blue masks, red masks and empty indices
+    into an (N, 34) float32 feature array, the same values encode_keys gives their keys.
+    """
+    blue = np.asarray(blue, dtype=np.uint64).reshape(-1, 1)
+    red = np.asarray(red, dtype=np.uint64).reshape(-1, 1)
+    slots = (((blue >> SLOT_SHIFTS) & 1) + 2 * ((red >> SLOT_SHIFTS) & 1)).astype(np.float32)
+    columns = KEY_BITS[np.asarray(empty, dtype=np.int64)]
+    features = np.take_along_axis(slots, np.maximum(columns, 0), axis=1)
+    features[columns < 0] = -1
+    return features
+
+
+def encode_boards(boards, canonical=True):
+    """Encodes Boards (by default in their canonical form, like the training data) into (N, 34) features"""
+    blue = np.empty(len(boards), dtype=np.uint64)
+    red = np.empty(len(boards), dtype=np.uint64)
+    empty = np.empty(len(boards), dtype=np.int64)
+    for i, board in enumerate(boards):
+        masks, empty[i] = (canonical_masks(board.masks, board.empty)[:2] if canonical
+                           else (board.masks, board.empty))
+        blue[i], red[i] = masks[1], masks[2]
+    return encode_masks(blue, red, empty)
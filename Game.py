@@ -1,6 +1,7 @@
 from Board import Board
 from SmartAgent import SmartAgent
 from AIAgent import AiAgent
+from Log import log
 
 # Constants for grading
 WIN_GRADE = 1.0
@@ -40,21 +41,21 @@ class Game:
         self.gamma = gamma
 
     def play_game(self):
-        while not self.board.is_full() and not self.board.is_winner(1) and not self.board.is_winner(2):
-            print(f"\nPlayer {self.current_player}'s turn")
+        while not self.board.is_full() and not self.board.winner():
+            log.info("\nPlayer %s's turn", self.current_player)
             current_player_obj = self.player1 if self.current_player == 1 else self.player2
 
             try:
                 part_pos, slot_pos, target_pos = current_player_obj.get_player_move()
 
                 if part_pos is None or slot_pos is None or target_pos is None:
-                    print("No valid moves left")
+                    log.info("No valid moves left")
                     break
 
                 self.board.place_marker(part_pos, slot_pos, self.current_player)
 
                 if part_pos == target_pos:
-                    print("Error: Cannot move the same part where marker was placed!")
+                    log.error("Error: Cannot move the same part where marker was placed!")
                     self.board.board[part_pos[0]][part_pos[1]].slots[slot_pos[0]][slot_pos[1]] = 0
                     continue
 
@@ -64,33 +65,32 @@ class Game:
                 self.game_history.append([board_str, 0])
 
                 if self.board.is_winner(self.current_player):
-                    print(f"Player {self.current_player} wins!")
+                    log.info("Player %s wins!", self.current_player)
                     self.update_grades(self.current_player)
                     return self.current_player, self.game_history
 
                 if self.board.is_full():
-                    print("Game ended in a tie")
+                    log.info("Game ended in a tie")
                     self.update_grades(0)
                     return 0, self.game_history
 
                 self.current_player = 2 if self.current_player == 1 else 1
 
             except Exception as e:
-                print(f"Error during move: {str(e)}")
-                import traceback
-                traceback.print_exc()
+                log.exception("Error during move: %s", e)
                 break
 
-        if self.board.is_winner(1):
-            print("Player 1 (Blue) wins!")
+        winner = self.board.winner()
+        if winner == 1:
+            log.info("Player 1 (Blue) wins!")
             self.update_grades(1)
             return 1, self.game_history
-        elif self.board.is_winner(2):
-            print("Player 2 (Red) wins!")
+        elif winner == 2:
+            log.info("Player 2 (Red) wins!")
             self.update_grades(2)
             return 2, self.game_history
         else:
-            print("Game ended in a tie")
+            log.info("Game ended in a tie")
             self.update_grades(0)
             return 0, self.game_history
 
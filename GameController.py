@@ -1,3 +1,6 @@
+from Log import log
+
+
 class GameController:
     def __init__(self, model):
         self.model = model
@@ -17,7 +20,7 @@ class GameController:
         # First place the marker
         marker_success = self.model.place_marker(part_pos, slot_pos)
         if not marker_success:
-            print(f"Failed to place marker at part {part_pos}, slot {slot_pos}")
+            log.info("Failed to place marker at part %s, slot %s", part_pos, slot_pos)
             return False, "Invalid marker placement", None
 
         # Then move the part
@@ -25,7 +28,7 @@ class GameController:
         if not move_success:
             # Undo the marker placement
             self.model.undo_marker_placement(part_pos, slot_pos)
-            print(f"Failed to move part from {target_pos} to {part_pos}: {message}")
+            log.info("Failed to move part from %s to %s: %s", target_pos, part_pos, message)
             return False, message, None
 
         # Check if the game is over after this move
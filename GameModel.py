@@ -3,6 +3,8 @@ from SmartAgent import SmartAgent
 from HumanPlayer import HumanPlayer
 from RandomPlayer import RandomPlayer
 from AIAgent import AiAgent
+from MoveGenerator import possible_targets
+from Log import log
 import json
 import os
 
@@ -148,7 +150,7 @@ class GameModel:
 
         # Always switch to next player after a successful move!
         self.switch_player()
-        print("DEBUG: After make_move, current_player is:", self.current_player)
+        log.debug("After make_move, current_player is: %s", self.current_player)
         return True, "Move successful", None
 
     def _validate_part_and_slot(self, part_pos, slot_pos):
@@ -156,23 +158,23 @@ class GameModel:
         # Check if part position is within bounds
         row, col = part_pos
         if not (0 <= row < 3 and 0 <= col < 3):
-            print("Part position out of bounds")
+            log.info("Part position out of bounds")
             return False
 
         # Check if part exists
         if self.board.board[part_pos[0]][part_pos[1]] is None:
-            print("Part does not exist at this position")
+            log.info("Part does not exist at this position")
             return False
 
         # Check if slot position is within bounds
         row, col = slot_pos
         if not (0 <= row < 2 and 0 <= col < 2):
-            print("Slot position out of bounds")
+            log.info("Slot position out of bounds")
             return False
 
         # Check if slot is empty
         if self.board.board[part_pos[0]][part_pos[1]].slots[slot_pos[0]][slot_pos[1]] != 0:
-            print("Slot is already occupied")
+            log.info("Slot is already occupied")
             return False
 
         return True
@@ -250,25 +252,14 @@ class GameModel:
             try:
                 return current_player.get_player_move()
             except Exception as e:
-                print(f"Error getting AI move: {str(e)}")
+                log.error("Error getting AI move: %s", e)
                 return None, None, None
 
         return None, None, None
 
     def get_possible_targets(self, part_pos):
         """Get all valid positions where a part can be moved to"""
-        targets = []
-        row, col = part_pos
-
-        # Check adjacent positions (up, down, left, right)
-        possible_adjacents = [(row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)]
-
-        for pos in possible_adjacents:
-            r, c = pos
-            if 0 <= r < 3 and 0 <= c < 3 and self.board.board[r][c] is None:
-                targets.append(pos)
-
-        return targets
+        return possible_targets(self.board, part_pos)
 
     def get_board_state(self):
         """Return a representation of the board for the view"""
@@ -298,7 +289,7 @@ class GameModel:
             else:
                 self.stats = {"blue_wins": 0, "red_wins": 0, "draws": 0}
         except Exception as e:
-            print(f"Error loading game stats: {str(e)}")
+            log.error("Error loading game stats: %s", e)
             self.stats = {"blue_wins": 0, "red_wins": 0, "draws": 0}
 
     def save_game_stats(self, filename="game_stats.json"):
@@ -307,4 +298,4 @@ class GameModel:
             with open(filename, "w") as file:
                 json.dump(self.stats, file)
         except Exception as e:
-            print(f"Error saving game stats: {str(e)}")
\ No newline at end of file
+            log.error("Error saving game stats: %s", e)
\ No newline at end of file
@@ -1,4 +1,5 @@
 from Player import Player
+from MoveGenerator import possible_targets
 
 
 class HumanPlayer(Player):
@@ -74,15 +75,4 @@ class HumanPlayer(Player):
 
     def get_possible_targets(self, part_pos):
         """Get all valid positions where a part can be moved to"""
-        targets = []
-        row, col = part_pos
-
-        # Check adjacent positions (up, down, left, right)
-        possible_adjacents = [(row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)]
-
-        for pos in possible_adjacents:
-            r, c = pos
-            if 0 <= r < 3 and 0 <= c < 3 and self.board.board[r][c] is None:
-                targets.append(pos)
-
-        return targets
\ No newline at end of file
+        return possible_targets(self.board, part_pos)
\ No newline at end of file
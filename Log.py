@@ -0,0 +1,48 @@
+import contextlib
+import logging
+import sys
+
+# Verbosity levels: QUIET keeps warnings and errors, NORMAL adds the game commentary,
+# VERBOSE adds debug traces and the reasons moves are rejected
+QUIET = logging.WARNING
+NORMAL = logging.INFO
+VERBOSE = logging.DEBUG
+
+# Every module logs through this logger. Messages take %-style arguments, which are
+# only formatted when the level is enabled, so a disabled call costs one level check.
+class _StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at the time, like print (so redirect_stdout works)"""
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+log = logging.getLogger("FourSquared")
+_handler = _StdoutHandler()
+_handler.setFormatter(logging.Formatter("%(message)s"))
+log.addHandler(_handler)
+log.setLevel(NORMAL)
+log.propagate = False
+
+
+def set_verbosity(level):
+    log.setLevel(level)
+
+
+def get_verbosity():
+    return log.level
+
+
+@contextlib.contextmanager
+def verbosity(level):
+    """Sets the verbosity inside a with block; the previous level comes back afterwards, also on errors"""
+    previous = get_verbosity()
+    set_verbosity(level)
+    try:
+        yield
+    finally:
+        set_verbosity(previous)
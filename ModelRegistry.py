@@ -0,0 +1,61 @@
+import os
+from EvaluationCache import EvaluationCache
+from NumpyModel import NumpyModel
+
+
+def load_model_file(filename='ann_model.keras'):
+    """
+    Loads the network for play. If a NumPy export (same name, .npz) at least as
+    new as the Keras file exists, it is used and TensorFlow is never imported.
+    """
+    exported = os.path.splitext(filename)[0] + '.npz'
+    if os.path.exists(exported) and (not os.path.exists(filename)
+                                     or os.path.getmtime(exported) >= os.path.getmtime(filename)):
+        return NumpyModel.load(exported)
+    from tensorflow.keras.models import load_model
+    return load_model(filename)
+
+
+class ModelRegistry:
+    """
+    Keeps every model loaded by this process, so all AiAgents that use the same file
+    share one instance. An entry is keyed by the absolute path and is loaded again
+    when the file (or its .npz export) changes on disk, or on an explicit reload.
+    Each model comes with an EvaluationCache of cache_size scores, dropped with it.
+    """
+    def __init__(self, cache_size=1 << 16):
+        self.models = {}  # absolute path -> (modification times, model, evaluation cache)
+        self.cache_size = cache_size
+        self.loads = 0
+
+    def file_times(self, path):
+        exported = os.path.splitext(path)[0] + '.npz'
+        return tuple(os.path.getmtime(name) if os.path.exists(name) else None for name in (path, exported))
+
+    def entry(self, filename):
+        path = os.path.abspath(filename)
+        times = self.file_times(path)
+        entry = self.models.get(path)
+        if entry is None or entry[0] != times:
+            entry = self.models[path] = (times, load_model_file(path), EvaluationCache(self.cache_size))
+            self.loads += 1
+        return entry
+
+    def get(self, filename='ann_model.keras'):
+        return self.entry(filename)[1]
+
+    def cache(self, filename='ann_model.keras'):
+        """The evaluation cache of the model currently loaded from filename"""
+        return self.entry(filename)[2]
+
+    def reload(self, filename='ann_model.keras'):
+        """Loads the file again even if it did not change"""
+        self.models.pop(os.path.abspath(filename), None)
+        return self.get(filename)
+
+    def clear(self):
+        self.models = {}
+
+
+# The registry shared by the whole process
+models = ModelRegistry()
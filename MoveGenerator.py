@@ -0,0 +1,55 @@
+from Board import PLACES
+
+# A turn places a marker in a part next to the empty position and slides that part
+# into it, so every legal move is fully determined by the empty position and the slot.
+# Move ids are slot bit indices (see Board); the target is always the empty position.
+
+
+def _adjacent(index):
+    row, col = index // 3, index % 3
+    neighbours = []
+    for r, c in ((row - 1, col), (row, col - 1), (row, col + 1), (row + 1, col)):
+        if 0 <= r < 3 and 0 <= c < 3:
+            neighbours.append(r * 3 + c)
+    return tuple(sorted(neighbours))
+
+
+# Grid indices of the parts that can slide into each empty position
+SLIDING_PARTS = [_adjacent(empty) for empty in range(9)]
+
+# Move ids available for each empty position, in get_empty_places order
+MOVE_IDS = [tuple(4 * index + slot for index in SLIDING_PARTS[empty] for slot in range(4))
+            for empty in range(9)]
+
+# (part_pos, slot_pos, target_pos) of each move id, per empty position (None if not a move)
+MOVE_TUPLES = [[None] * 36 for empty in range(9)]
+for _empty in range(9):
+    for _move_id in MOVE_IDS[_empty]:
+        MOVE_TUPLES[_empty][_move_id] = PLACES[_move_id] + ((_empty // 3, _empty % 3),)
+
+# Targets of each part position, per empty position
+TARGETS = [{PLACES[4 * index][0]: [(empty // 3, empty % 3)] for index in SLIDING_PARTS[empty]}
+           for empty in range(9)]
+
+
+def legal_move_ids(board):
+    """Returns the move ids (slot bit indices) that can be played on board"""
+    occupied = board.masks[1] | board.masks[2]
+    return [move_id for move_id in MOVE_IDS[board.empty] if not (occupied >> move_id) & 1]
+
+
+def legal_moves(board):
+    """Returns every legal move on board as (part_pos, slot_pos, target_pos)"""
+    occupied = board.masks[1] | board.masks[2]
+    tuples = MOVE_TUPLES[board.empty]
+    return [tuples[move_id] for move_id in MOVE_IDS[board.empty] if not (occupied >> move_id) & 1]
+
+
+def move_tuple(board, move_id):
+    """Converts a move id into (part_pos, slot_pos, target_pos) for the current empty position"""
+    return MOVE_TUPLES[board.empty][move_id]
+
+
+def possible_targets(board, part_pos):
+    """Get all valid positions where a part can be moved to"""
+    return list(TARGETS[board.empty].get(part_pos, ()))
@@ -1,59 +1,151 @@
 import json
 import os
+import sys
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '0'
 import numpy as np
 from sklearn.model_selection import train_test_split
-from tensorflow.keras.models import Sequential
+from tensorflow.keras.models import Sequential, load_model
 from tensorflow.keras.layers import Dense, Dropout
 from tensorflow.keras.optimizers import Adam
 import matplotlib.pyplot as plt
-
-# Load the Q-table data
-with open('Board-QTable.json', 'r') as f:
-    data = json.load(f)
-
-X_list = []
-y_list = []
-char_to_int = {'X': -1, '0': 0, '1': 1, '2': 2}
-
-for key, value in data.items():
-    X_list.append([char_to_int[char] for char in key])
-    y_list.append(value[0])
-
-X = np.array(X_list)
-y = np.array(y_list)
-
-print("Dataset size:", X.shape, "features,", y.shape, "labels")
-
-# Split into training and test sets (80/20)
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, random_state=42)
-print("Train/test split:", X_train.shape, X_test.shape)
-
-# === Build the Keras model ===
-model = Sequential([
-    Dense(128, activation='relu', input_shape=(34,)),  # 34 inputs
-    Dropout(0.3),
-    Dense(64, activation='relu'),
-    Dropout(0.3),
-    Dense(32, activation='relu'),
-    Dense(1, activation='sigmoid')  # Output score between 0 and 1
-])
-
-# Compile the model
-model.compile(optimizer=Adam(learning_rate=0.0005),
-              loss='mean_squared_error',
-              metrics=['mae'])
-
-# Train the model
-history = model.fit(X_train, y_train,
-                    validation_split=0.2,
-                    epochs=40,
-                    batch_size=64,
-                    verbose=1)
-
-# Evaluate the model
-test_loss, test_mae = model.evaluate(X_test, y_test)
+from Symmetry import canonicalise_table
+from NumpyModel import export_keras_model
+from FeatureEncoder import encode_keys
+from BinaryQTable import BinaryQTable, pack_keys, unpack_keys
+from SqliteQTable import SqliteQTable
+from QTableDataset import qtable_dataset
+
+QTABLE_FILE = 'Board-QTable.json'  # or Board-QTable.bin (BinaryQTable.py) or Board-QTable.db (SqliteQTable.py)
+
+# Fine-tune the saved model on the entries added or changed since the last training
+# (listed in CHECKPOINT_FILE), plus a rehearsal sample of the others, instead of
+# training a new model on the whole table. Only used when both files exist.
+FINE_TUNE = True
+CHECKPOINT_FILE = 'ann_model.checkpoint.npz'
+FINE_TUNE_EPOCHS = 5
+REHEARSAL_RATIO = 0.25  # Unchanged entries replayed per new or changed entry
+REHEARSAL_MIN = 64  # ... but at least this many, however few entries changed
+MIN_SPLIT_SIZE = 100  # Smaller datasets are trained on whole, without test or validation rows
+
+# Stream shuffled batches from the table file (QTableDataset.py) instead of loading it
+# into memory, so tables larger than RAM can be trained on. Trains from scratch.
+STREAM = False
+
+if STREAM:
+    # Positions are held out by key, separately for validation and for the final test
+    fine_tune = False
+    train_data = qtable_dataset(QTABLE_FILE, batch_size=64, split="train", seed=42)
+    validation_data = qtable_dataset(QTABLE_FILE, batch_size=64, split="validation", seed=42)
+    test_data = qtable_dataset(QTABLE_FILE, batch_size=64, split="test", seed=42)
+else:
+    # Load the Q-table data as packed keys (see BinaryQTable.py), grades and counts
+    if QTABLE_FILE.endswith('.db'):
+        # Stream the rows through a cursor and pack them chunk by chunk
+        chunks = [(pack_keys(keys), grades.astype(np.float32), counts)
+                  for keys, grades, counts in SqliteQTable(QTABLE_FILE).chunks()]
+        keys, grades, counts = (np.concatenate(arrays) for arrays in zip(*chunks)) if chunks else (
+            np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.uint32))
+    elif QTABLE_FILE.endswith('.bin'):
+        # Binary tables are canonical already, and are read straight into arrays
+        table = BinaryQTable(QTABLE_FILE)
+        keys = np.array(table.keys)
+        grades = np.array(table.grades, dtype=np.float32)
+        counts = np.array(table.counts, dtype=np.uint32)
+    else:
+        with open(QTABLE_FILE, 'r') as f:
+            data = json.load(f)
+
+        # Merge rotations and mirror images of the same board into one sample
+        data = canonicalise_table(data)
+
+        keys = pack_keys(list(data.keys()))
+        grades = np.fromiter((value[0] for value in data.values()), dtype=np.float32, count=len(data))
+        counts = np.fromiter((value[1] for value in data.values()), dtype=np.uint32, count=len(data))
+
+    fine_tune = FINE_TUNE and os.path.exists(CHECKPOINT_FILE) and os.path.exists("ann_model.keras")
+    if fine_tune:
+        with np.load(CHECKPOINT_FILE) as checkpoint:
+            old_keys, old_grades, old_counts = checkpoint["keys"], checkpoint["grades"], checkpoint["counts"]
+        # The checkpoint keys are sorted, so every entry is looked up with one binary search
+        index = np.minimum(np.searchsorted(old_keys, keys), max(len(old_keys) - 1, 0))
+        if len(old_keys):
+            unchanged = (old_keys[index] == keys) & (old_grades[index] == grades) & (old_counts[index] == counts)
+        else:
+            unchanged = np.zeros(len(keys), dtype=bool)
+        changed = np.flatnonzero(~unchanged)
+        if len(changed) == 0:
+            print("No new or changed entries since the last training")
+            sys.exit(0)
+        # Every changed entry is trained on, since the checkpoint records them all as learned.
+        # Validation and test rows are unchanged entries outside the rehearsal sample, so
+        # they show whether the old positions are still known after fine-tuning.
+        sample_size = max(REHEARSAL_MIN, int(len(changed) * REHEARSAL_RATIO))
+        unchanged_rows = np.random.default_rng(42).permutation(np.flatnonzero(unchanged))
+        rehearsal = unchanged_rows[:sample_size]
+        held_out = unchanged_rows[sample_size:2 * sample_size]
+        print("Fine-tuning on", len(changed), "new or changed entries and", len(rehearsal), "rehearsal entries;",
+              len(held_out), "other entries held out")
+        selected = np.concatenate([changed, rehearsal])
+    else:
+        selected = np.arange(len(keys))
+
+    X = encode_keys(unpack_keys(keys[selected]))
+    y = grades[selected]
+
+    print("Dataset size:", X.shape, "features,", y.shape, "labels")
+
+    validation_data = None
+    validation_split = 0.0
+    if fine_tune and len(held_out) >= 2:
+        # Half of the held-out entries for validation, half for the test
+        X_held = encode_keys(unpack_keys(keys[held_out]))
+        X_train, y_train = X, y
+        validation_data = (X_held[::2], grades[held_out[::2]])
+        X_test, y_test = X_held[1::2], grades[held_out[1::2]]
+        print("Validation/test rows from unchanged entries:", validation_data[0].shape, X_test.shape)
+    elif not fine_tune and len(X) >= MIN_SPLIT_SIZE:
+        # Split into training and test sets (80/20), and validate on 20% of the training set
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42)
+        validation_split = 0.2
+        print("Train/test split:", X_train.shape, X_test.shape)
+    else:
+        # Nothing to hold out: the test loss below is on the training rows
+        X_train, X_test, y_train, y_test = X, X, y, y
+        print("Training on all", len(X), "rows without a test split")
+
+if fine_tune:
+    # Carries on from the saved weights and optimizer state
+    model = load_model("ann_model.keras")
+else:
+    # === Build the Keras model ===
+    model = Sequential([
+        Dense(128, activation='relu', input_shape=(34,)),  # 34 inputs
+        Dropout(0.3),
+        Dense(64, activation='relu'),
+        Dropout(0.3),
+        Dense(32, activation='relu'),
+        Dense(1, activation='sigmoid')  # Output score between 0 and 1
+    ])
+
+    # Compile the model
+    model.compile(optimizer=Adam(learning_rate=0.0005),
+                  loss='mean_squared_error',
+                  metrics=['mae'])
+
+# Train and evaluate the model
+if STREAM:
+    history = model.fit(train_data, validation_data=validation_data, epochs=40, verbose=1)
+    test_loss, test_mae = model.evaluate(test_data)
+    X_test = next(iter(test_data))[0].numpy()
+else:
+    history = model.fit(X_train, y_train,
+                        validation_data=validation_data,
+                        validation_split=validation_split,
+                        epochs=FINE_TUNE_EPOCHS if fine_tune else 40,
+                        batch_size=64,
+                        verbose=1)
+    test_loss, test_mae = model.evaluate(X_test, y_test)
 print(f"Test Loss: {test_loss:.4f}, Test MAE: {test_mae:.4f}")
 
 # Predict on new data
@@ -62,13 +154,20 @@ print("Predictions for the first 5 rows:", predictions)
 
 # Save the model for later use in ANNAgent
 model.save("ann_model.keras")
+export_keras_model(model, "ann_model.npz")  # TensorFlow-free copy for AiAgent
+
+# Remember what this model was trained on, for the next fine-tuning run
+if not STREAM:
+    order = np.argsort(keys)
+    np.savez(CHECKPOINT_FILE, keys=keys[order], grades=grades[order], counts=counts[order])
 
 plt.figure(figsize=(15, 6))
 
 # Loss plot
 plt.subplot(1, 2, 1)
 plt.plot(history.history['loss'], label='Training Loss')
-plt.plot(history.history['val_loss'], label='Validation Loss')
+if 'val_loss' in history.history:
+    plt.plot(history.history['val_loss'], label='Validation Loss')
 plt.title('Training and Validation Loss')
 plt.xlabel('Epochs')
 plt.ylabel('Loss')
@@ -77,7 +176,8 @@ plt.legend()
 # MAE plot
 plt.subplot(1, 2, 2)
 plt.plot(history.history['mae'], label='Training MAE')
-plt.plot(history.history['val_mae'], label='Validation MAE')
+if 'val_mae' in history.history:
+    plt.plot(history.history['val_mae'], label='Validation MAE')
 plt.title('Training and Validation MAE')
 plt.xlabel('Epochs')
 plt.ylabel('Mean Absolute Error')
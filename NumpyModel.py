@@ -0,0 +1,70 @@
+import sys
+import numpy as np
+from Log import log
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+    "tanh": np.tanh,
+}
+
+
+class NumpyModel:
+    """
+    Forward pass of the Dense network from NeuronNetwork.py in plain NumPy, so
+    playing does not need TensorFlow. Dropout only acts while training, so it
+    is left out. Called like the Keras model: model(features) -> (N, 1) array.
+    """
+    def __init__(self, layers):
+        self.layers = layers  # list of (weights, bias, activation name)
+
+    @classmethod
+    def load(cls, filename="ann_model.npz"):
+        """Loads weights written by export_keras_model"""
+        with np.load(filename) as data:
+            activations = [str(name) for name in data["activations"]]
+            layers = [(data[f"kernel_{i}"], data[f"bias_{i}"], activation)
+                      for i, activation in enumerate(activations)]
+        return cls(layers)
+
+    def __call__(self, features, training=False):
+        values = np.asarray(features, dtype=np.float32)
+        for weights, bias, activation in self.layers:
+            values = ACTIVATIONS[activation](values @ weights + bias)
+        return values
+
+    def predict(self, features, verbose=0):
+        return self(features)
+
+
+def export_keras_model(model, filename="ann_model.npz"):
+    """
+    Saves the Dense layers of a Keras model (or a .keras file name) as NumPy arrays
+    for NumpyModel. Dropout layers are skipped; any other layer is not supported.
+    """
+    if isinstance(model, str):
+        from tensorflow.keras.models import load_model
+        model = load_model(model)
+
+    arrays = {}
+    activations = []
+    for layer in model.layers:
+        kind = type(layer).__name__
+        if kind == "Dropout":
+            continue
+        if kind != "Dense":
+            raise ValueError(f"Cannot export layer {layer.name} of type {kind}")
+        kernel, bias = layer.get_weights()
+        arrays[f"kernel_{len(activations)}"] = kernel.astype(np.float32)
+        arrays[f"bias_{len(activations)}"] = bias.astype(np.float32)
+        activations.append(layer.get_config()["activation"])
+
+    np.savez(filename, activations=np.array(activations), **arrays)
+    log.info("Exported %s layers to %s", len(activations), filename)
+
+
+if __name__ == "__main__":
+    # Usage: python NumpyModel.py [ann_model.keras] [ann_model.npz]
+    keras_file = sys.argv[1] if len(sys.argv) > 1 else "ann_model.keras"
+    export_keras_model(keras_file, sys.argv[2] if len(sys.argv) > 2 else keras_file.replace(".keras", ".npz"))
@@ -0,0 +1,138 @@
+import json
+import numpy as np
+from BinaryQTable import BinaryQTable, pack_keys, pack_masks
+from FeatureEncoder import KEY_BITS, encode_keys, encode_masks
+from SqliteQTable import SqliteQTable
+from Symmetry import canonical_masks_array
+
+# Positions are split by packed key, so the split is the same on every pass and for
+# every table format: of every HOLDOUT_EVERY keys, one is for validation and one for testing
+HOLDOUT_EVERY = 5
+SPLIT_REMAINDERS = {"validation": 0, "test": 1}
+KEY_WEIGHTS = np.where(KEY_BITS >= 0, np.left_shift(np.uint64(1), np.maximum(KEY_BITS, 0).astype(np.uint64)),
+                       np.uint64(0))
+
+
+def keys_to_masks(keys):
+    """Turns an 'S34' array of str_board_history keys into (blue, red, empty) arrays"""
+    chars = np.frombuffer(np.ascontiguousarray(keys, dtype="S34").tobytes(), dtype=np.uint8).reshape(-1, 34)
+    empty = np.argmax(chars == ord("X"), axis=1) // 4  # The XX pair starts at character 4 * empty
+    weights = KEY_WEIGHTS[empty]
+    blue = np.where(chars == ord("1"), weights, np.uint64(0)).sum(axis=1, dtype=np.uint64)
+    red = np.where(chars == ord("2"), weights, np.uint64(0)).sum(axis=1, dtype=np.uint64)
+    return blue, red, empty.astype(np.int64)
+
+
+def json_records(filename, size=1 << 16, block_size=1 << 20):
+    """
+    Reads a JSON QTable ({key: [grade, count]}) incrementally, block_size characters
+    at a time, and yields (keys as an 'S34' array, grades, counts) for size records at a time
+    """
+    decoder = json.JSONDecoder()
+    keys, grades, counts = [], [], []
+    with open(filename, "r") as file:
+        buffer = file.read(block_size).lstrip()
+        if not buffer.startswith("{"):
+            raise ValueError(f"{filename} is not a JSON QTable")
+        position = 1
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) and buffer[position] == "}":
+                break
+            try:
+                key, end = decoder.raw_decode(buffer, position)
+                while end < len(buffer) and buffer[end] in " \t\r\n:":
+                    end += 1
+                (grade, count), end = decoder.raw_decode(buffer, end)
+            except ValueError:
+                # The buffer ends inside this record (values are [grade, count] lists, so
+                # a cut record never parses): keep its start and read the next block
+                more = file.read(block_size)
+                if not more:
+                    raise
+                buffer = buffer[position:] + more
+                position = 0
+                continue
+            position = end
+            keys.append(key)
+            grades.append(grade)
+            counts.append(count)
+            if len(keys) == size:
+                yield np.array(keys, dtype="S34"), np.array(grades, dtype=np.float32), np.array(counts, dtype=np.uint32)
+                keys, grades, counts = [], [], []
+    if keys:
+        yield np.array(keys, dtype="S34"), np.array(grades, dtype=np.float32), np.array(counts, dtype=np.uint32)
+
+
+def encoded_chunks(filename, size=1 << 16):
+    """
+    Yields (packed keys, features, grades) for chunks of a JSON, binary (.bin) or
+    SQLite (.db) QTable. JSON keys are canonicalised chunk by chunk; symmetric copies
+    that fall in different chunks stay separate samples instead of being merged.
+    """
+    if filename.endswith(".db"):
+        chunks = SqliteQTable(filename).chunks(size)
+    elif filename.endswith(".bin"):
+        chunks = BinaryQTable(filename).chunks(size)
+    else:
+        for keys, grades, counts in json_records(filename, size):
+            blue, red, empty = canonical_masks_array(*keys_to_masks(keys))
+            yield pack_masks(blue, red, empty), encode_masks(blue, red, empty), grades
+        return
+    # Binary and SQLite tables are canonical already
+    for keys, grades, counts in chunks:
+        yield pack_keys(keys), encode_keys(keys), grades.astype(np.float32)
+
+
+def split_rows(packed, split):
+    """Mask of the packed keys that belong to split ("train", "validation" or "test")"""
+    remainders = packed % HOLDOUT_EVERY
+    if split == "train":
+        return ~np.isin(remainders, list(SPLIT_REMAINDERS.values()))
+    return remainders == SPLIT_REMAINDERS[split]
+
+
+def shuffled_batches(filename, batch_size=64, buffer_size=1 << 16, chunk_size=1 << 14, split="train", seed=None):
+    """
+    Streams (features, grades) batches of one split of a QTable file. Chunks go through a shuffle
+    buffer of at most buffer_size + chunk_size rows: once it is full, it is shuffled and
+    everything but half of it is emitted, so memory does not grow with the table.
+    """
+    rng = np.random.default_rng(seed)
+    pool_features = np.empty((0, 34), dtype=np.float32)
+    pool_grades = np.empty(0, dtype=np.float32)
+    for packed, features, grades in encoded_chunks(filename, chunk_size):
+        rows = split_rows(packed, split)
+        pool_features = np.concatenate([pool_features, features[rows]])
+        pool_grades = np.concatenate([pool_grades, grades[rows]])
+        if len(pool_grades) < buffer_size:
+            continue
+        order = rng.permutation(len(pool_grades))
+        emitted = (len(pool_grades) - buffer_size // 2) // batch_size * batch_size
+        for start in range(0, emitted, batch_size):
+            batch = order[start:start + batch_size]
+            yield pool_features[batch], pool_grades[batch]
+        pool_features, pool_grades = pool_features[order[emitted:]], pool_grades[order[emitted:]]
+    order = rng.permutation(len(pool_grades))
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        yield pool_features[batch], pool_grades[batch]
+
+
+def qtable_dataset(filename, batch_size=64, buffer_size=1 << 16, chunk_size=1 << 14, split="train", seed=None):
+    """
+    tf.data.Dataset of (features, grades) batches streamed from a QTable file, for
+    model.fit. Every pass rereads the file; prefetch reads and encodes the next batches
+    on a background thread while the model trains on the current one.
+    """
+    import tensorflow as tf
+    seeds = np.random.SeedSequence(seed)
+
+    def generate():
+        # A new shuffle on every pass over the data
+        yield from shuffled_batches(filename, batch_size, buffer_size, chunk_size, split,
+                                    seeds.spawn(1)[0])
+
+    signature = (tf.TensorSpec(shape=(None, 34), dtype=tf.float32), tf.TensorSpec(shape=(None,), dtype=tf.float32))
+    return tf.data.Dataset.from_generator(generate, output_signature=signature).prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,222 @@
+import json
+import os
+import shutil
+import time
+import numpy as np
+from BatchSimulator import apply_moves, simulate
+from BinaryQTable import unpack_keys
+from FeatureEncoder import encode_keys, encode_masks
+from ModelRegistry import load_model_file
+from NumpyModel import export_keras_model
+from Symmetry import canonical_masks_array
+from Log import log
+
+
+class ReplayBuffer:
+    """The most recent capacity (packed key, grade) rows of self-play, oldest overwritten first"""
+    def __init__(self, capacity=200000):
+        self.capacity = capacity
+        self.keys = np.zeros(capacity, dtype=np.int64)
+        self.grades = np.zeros(capacity, dtype=np.float32)
+        self.size = 0
+        self.next = 0  # Slot the next row goes to
+
+    def __len__(self):
+        return self.size
+
+    def add(self, keys, grades):
+        keys, grades = keys[-self.capacity:], grades[-self.capacity:]
+        slots = (self.next + np.arange(len(keys))) % self.capacity
+        self.keys[slots] = keys
+        self.grades[slots] = grades
+        self.next = (self.next + len(keys)) % self.capacity
+        self.size = min(self.size + len(keys), self.capacity)
+
+    def sample(self, count, rng):
+        """Features and grades of count rows drawn without replacement"""
+        rows = rng.choice(self.size, size=min(count, self.size), replace=False)
+        return encode_keys(unpack_keys(self.keys[rows])), self.grades[rows]
+
+    def save(self, filename):
+        np.savez(filename, keys=self.keys[:self.size], grades=self.grades[:self.size],
+                 next=self.next, capacity=self.capacity)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            buffer = cls(int(data["capacity"]))
+            buffer.size = len(data["keys"])
+            buffer.keys[:buffer.size] = data["keys"]
+            buffer.grades[:buffer.size] = data["grades"]
+            buffer.next = int(data["next"])
+        return buffer
+
+
+def marker_count(blue, red):
+    """Markers on each board, i.e. the number of moves played"""
+    return np.unpackbits((blue | red).view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def model_policy(model, rng, epsilon=0.0, opening_moves=0):
+    """
+    BatchSimulator policy that scores every successor with the network (grades are
+    Blue's view, so Blue takes the highest score and Red the lowest). A random legal
+    move is played instead with probability epsilon, and for the first opening_moves moves.
+    """
+    def choose(blue, red, empty, player, moves, legal):
+        games, columns = np.nonzero(legal)
+        successors = apply_moves(blue[games], red[games], empty[games], player[games], moves[games, columns])
+        scores = np.asarray(model(encode_masks(*canonical_masks_array(*successors)))).reshape(-1)
+        values = np.full(legal.shape, -np.inf)
+        values[games, columns] = np.where(player[games] == 1, scores, -scores)
+        chosen = values.argmax(axis=1)
+
+        explore = rng.random(len(blue)) < epsilon
+        explore |= marker_count(blue, red) < opening_moves
+        if explore.any():
+            random_scores = np.where(legal[explore], rng.random(legal[explore].shape), -1.0)
+            chosen[explore] = random_scores.argmax(axis=1)
+        return chosen
+    return choose
+
+
+def match_policy(blue_policy, red_policy):
+    """Policy that lets each colour's policy move for its own games"""
+    def choose(blue, red, empty, player, moves, legal):
+        chosen = np.zeros(len(blue), dtype=np.int64)
+        for marker, policy in ((1, blue_policy), (2, red_policy)):
+            games = player == marker
+            if games.any():
+                chosen[games] = policy(blue[games], red[games], empty[games], player[games], moves[games], legal[games])
+        return chosen
+    return choose
+
+
+class SelfPlayLoop:
+    """
+    Generate, train, gate, promote:
+    1. the incumbent model (model_file) plays games against itself, with epsilon
+       exploration, and the positions join the replay buffer;
+    2. a copy of the incumbent is fine-tuned on a sample of the buffer;
+    3. the candidate plays gate_games against the incumbent, half of them as Blue,
+       after random openings;
+    4. it replaces model_file only if it scores at least gate_score and its wins
+       beat its losses by z standard deviations.
+
+    Every stage is timed, and the state, buffer and candidate are saved to directory
+    after each one, so a loop that crashed resumes at the stage it was in. Each
+    generate stage writes a new buffer file, which only counts once state.json names it.
+    """
+    def __init__(self, directory="selfplay", model_file="ann_model.keras", games=2000, gamma=0.9,
+                 buffer_size=200000, sample_size=50000, epochs=2, batch_size=64, epsilon=0.1,
+                 gate_games=400, opening_moves=4, gate_score=0.55, z=1.96, seed=None):
+        self.directory = directory
+        self.model_file = model_file
+        self.games = games
+        self.gamma = gamma
+        self.sample_size = sample_size
+        self.epochs = epochs
+        self.batch_size = batch_size
+        self.epsilon = epsilon
+        self.gate_games = gate_games
+        self.opening_moves = opening_moves
+        self.gate_score = gate_score
+        self.z = z
+        self.rng = np.random.default_rng(seed)
+        os.makedirs(directory, exist_ok=True)
+        self.state_file = os.path.join(directory, "state.json")
+        self.candidate_file = os.path.join(directory, "candidate.keras")
+        self.state = {"iteration": 0, "stage": "generate", "buffer": None, "current": {}, "history": []}
+        if os.path.exists(self.state_file):
+            with open(self.state_file, "r") as file:
+                self.state = json.load(file)
+            log.info("Resuming self-play at iteration %s, stage %s", self.state["iteration"], self.state["stage"])
+        buffer_file = self.state.get("buffer")
+        self.buffer = (ReplayBuffer.load(os.path.join(directory, buffer_file)) if buffer_file
+                       else ReplayBuffer(buffer_size))
+
+    def save_state(self, stage):
+        self.state["stage"] = stage
+        temporary = self.state_file + ".tmp"
+        with open(temporary, "w") as file:
+            json.dump(self.state, file, indent=1)
+        os.replace(temporary, self.state_file)
+        # Buffers the state no longer names: replaced ones, or one a crash left unnamed
+        for filename in os.listdir(self.directory):
+            if filename.startswith("replay_buffer_") and filename != self.state["buffer"]:
+                os.remove(os.path.join(self.directory, filename))
+
+    def run(self, iterations=1):
+        stages = {"generate": self.generate, "train": self.train, "gate": self.gate, "promote": self.promote}
+        order = list(stages)
+        for iteration in range(iterations):
+            self.state["current"]["iteration"] = self.state["iteration"]
+            for stage in order[order.index(self.state["stage"]):]:
+                start = time.perf_counter()
+                stages[stage]()
+                seconds = time.perf_counter() - start
+                self.state["current"][f"{stage}_seconds"] = seconds
+                log.info("Iteration %s: %s took %.1fs", self.state["iteration"], stage, seconds)
+                next_stage = order[order.index(stage) + 1] if stage != order[-1] else "generate"
+                if next_stage == "generate":
+                    self.state["history"].append(self.state["current"])
+                    self.state["current"] = {}
+                    self.state["iteration"] += 1
+                self.save_state(next_stage)
+        return self.state["history"]
+
+    def generate(self):
+        model = load_model_file(self.model_file)
+        policy = model_policy(model, self.rng, self.epsilon)
+        keys, grades, results = simulate(self.games, self.gamma, policy, canonical=True)
+        self.buffer.add(keys, grades.astype(np.float32))
+        # The previous buffer stays until save_state names this one
+        buffer_file = f"replay_buffer_{self.state['iteration']}.npz"
+        self.buffer.save(os.path.join(self.directory, buffer_file))
+        self.state["buffer"] = buffer_file
+        self.state["current"].update(games=self.games, positions=len(keys), buffer=len(self.buffer))
+
+    def train(self):
+        from tensorflow.keras.models import load_model
+        model = load_model(self.model_file)  # Carries on with the incumbent's weights and optimizer
+        features, grades = self.buffer.sample(self.sample_size, self.rng)
+        history = model.fit(features, grades, epochs=self.epochs, batch_size=self.batch_size,
+                            validation_split=0.1, verbose=0)
+        model.save(self.candidate_file)
+        export_keras_model(model, os.path.splitext(self.candidate_file)[0] + ".npz")
+        self.state["current"].update(loss=float(history.history["loss"][-1]),
+                                     val_loss=float(history.history["val_loss"][-1]))
+
+    def gate(self):
+        candidate = load_model_file(self.candidate_file)
+        incumbent = load_model_file(self.model_file)
+        wins = losses = ties = 0
+        half = self.gate_games // 2
+        for candidate_marker, count in ((1, half), (2, self.gate_games - half)):
+            players = {candidate_marker: model_policy(candidate, self.rng, 0.0, self.opening_moves),
+                       3 - candidate_marker: model_policy(incumbent, self.rng, 0.0, self.opening_moves)}
+            results = simulate(count, self.gamma, match_policy(players[1], players[2]))[2]
+            wins += int(np.sum(results == candidate_marker))
+            losses += int(np.sum(results == 3 - candidate_marker))
+            ties += int(np.sum(results == 0))
+        score = (wins + 0.5 * ties) / max(self.gate_games, 1)
+        decisive = wins + losses
+        z = (wins - losses) / np.sqrt(decisive) if decisive else 0.0
+        self.state["current"].update(wins=wins, losses=losses, ties=ties, score=score, z=float(z),
+                                     promoted=bool(score >= self.gate_score and z >= self.z))
+        log.info("Candidate vs incumbent: %s wins, %s losses, %s ties (score %.3f, z %.2f)",
+                 wins, losses, ties, score, z)
+
+    def promote(self):
+        if not self.state["current"].get("promoted"):
+            log.info("Candidate rejected, keeping %s", self.model_file)
+            return
+        shutil.copy(self.candidate_file, self.model_file)
+        shutil.copy(os.path.splitext(self.candidate_file)[0] + ".npz", os.path.splitext(self.model_file)[0] + ".npz")
+        log.info("Candidate promoted to %s", self.model_file)
+
+
+if __name__ == "__main__":
+    # Usage: python SelfPlay.py [iterations]
+    import sys
+    SelfPlayLoop().run(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
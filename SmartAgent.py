@@ -2,161 +2,381 @@ from Player import Player
 import random
 import os
 import json
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from Board import Board
+from MoveGenerator import legal_moves, legal_move_ids, possible_targets, MOVE_TUPLES
+from Symmetry import canonical_key, canonical_history
+from TranspositionTable import TranspositionTable, EXACT, LOWER, UPPER
+from Log import log
+
+# State of a root-split worker process
+_shared_alpha = None  # Best exact root score found by any worker in the current iteration
+_shared_nodes = None  # Nodes searched by all workers in the current iteration, for node_limit
+_worker_agents = {}  # One agent per marker, so tables and history survive between tasks
+
+
+def _init_worker(shared_alpha, shared_nodes):
+    global _shared_alpha, _shared_nodes
+    _shared_alpha = shared_alpha
+    _shared_nodes = shared_nodes
+
+
+def _search_root_move(history, marker, depth, move, alpha, wall_deadline, node_limit):
+    """
+    Runs in a pool process: plays one root move on the board given by its history
+    key and searches it. alpha=None reads the shared alpha of the other workers.
+    wall_deadline is a time.time() value, since perf_counter is per process.
+    node_limit is the budget of the whole iteration, charged to the shared node count.
+    Returns (score, alpha_used, nodes, stopped); score > alpha_used means it is exact.
+    """
+    agent = _worker_agents.get(marker)
+    if agent is None:
+        agent = _worker_agents[marker] = SmartAgent(Board(), marker)
+    agent.board = Board.from_history(history)
+    agent.search_depth = depth
+    agent.node_limit = node_limit
+    agent.deadline = None
+    if wall_deadline is not None:
+        agent.deadline = time.perf_counter() + (wall_deadline - time.time())
+    # Checked from the first node, so tasks that start after the budget ran out stop at once
+    agent.next_check = 0 if node_limit is not None or wall_deadline is not None else float('inf')
+    agent.nodes = 0
+    agent.charged_nodes = 0
+    agent.shared_nodes = _shared_nodes if node_limit is not None else None
+    agent.stopped = False
+    if alpha is None:
+        alpha = _shared_alpha.value
+
+    part_pos, slot_pos, target_pos = move
+    agent.board.make_move(part_pos, slot_pos, target_pos, marker)
+    score = agent.minimax(0, False, alpha, float('inf'))
+
+    if score > alpha and not agent.stopped:
+        with _shared_alpha.get_lock():
+            if score > _shared_alpha.value:
+                _shared_alpha.value = score
+    return score, alpha, agent.nodes, agent.stopped
 
 
 class SmartAgent(Player):
-    def __init__(self, board: Board, marker):
+    def __init__(self, board: Board, marker, time_limit=None, node_limit=None, workers=None):
+        """
+        Without limits every move is searched to max_depth. With time_limit (seconds
+        per move) and/or node_limit (minimax nodes per move) the search deepens one
+        ply at a time until the budget runs out, and plays the best move of the last
+        iteration that finished. workers > 1 splits the root moves of each iteration
+        over a process pool; the chosen move is the same as with one process.
+        """
         Player.__init__(self, board, marker=marker)
         self.opponent_marker = 2 if marker == 1 else 1
         self.max_depth = 3  # Limit search depth due to complexity
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.search_depth = self.max_depth  # Depth of the iteration being searched
+        self.completed_depth = 0  # Deepest iteration finished for the last move
+        self.nodes = 0
+        self.cutoffs = 0  # Beta cutoffs in the last search
+        self.first_move_cutoffs = 0  # ... of which came from the first move tried
+        self.next_check = float('inf')  # Node count at which the budget is checked next
+        self.deadline = None
+        self.stopped = False
         self.position_scores = {}  # Initialize the dictionary
+        self.transposition_table = TranspositionTable(1 << 16)  # Search results by position hash
+        self.workers = workers
+        self.pool = None  # Created on the first parallel search
+        self.shared_alpha = None
+        self.shared_nodes = None  # Node count of all pool workers in an iteration (see get_pool)
+        self.charged_nodes = 0  # Nodes of this agent already added to shared_nodes
 
     def get_player_move(self):
-        print(f"Player {self.marker} (Smart Agent) is thinking...")
-        best_score = float('-inf')
-        best_move = None
-        best_target = None
-
-        empty_places = self.board.get_empty_places()
-        if not empty_places:
-            return None, None, None  # Fixed: Return three None values
-
-        # For each possible placement
-        for part_pos, slot_pos in empty_places:
-            # Get possible movements after placing
-            possible_targets = self.get_possible_targets(part_pos)
-
-            # Skip if no possible targets
-            if not possible_targets:
-                continue
+        log.info("Player %s (Smart Agent) is thinking...", self.marker)
+        self.transposition_table.new_search()
 
-            # For each possible movement
-            for target_pos in possible_targets:
-                # Try this move
-                self.board.place_marker(part_pos, slot_pos, self.marker)
+        valid_moves = legal_moves(self.board)
+        if not valid_moves:
+            return None, None, None  # No valid moves available
 
-                # Check if this is a winning move (no need to continue if so)
-                if self.board.is_winner(self.marker):
-                    # Undo move for evaluation
-                    self.board.board[part_pos[0]][part_pos[1]].slots[slot_pos[0]][slot_pos[1]] = 0
-                    print(f"Found winning move: Place at {part_pos},{slot_pos} then move to {target_pos}")
-                    return (part_pos, slot_pos, target_pos)
+        for part_pos, slot_pos, target_pos in valid_moves:
+            # Try this move
+            self.board.place_marker(part_pos, slot_pos, self.marker)
 
-                # If not immediately winning, move the part
-                original_part = self.board.board[part_pos[0]][part_pos[1]]
-                self.board.move_part(part_pos, target_pos)
-
-                # Evaluate with minimax
-                score = self.minimax(0, False, float('-inf'), float('inf'))
-
-                # Undo the part movement
-                self.board.board[target_pos[0]][target_pos[1]] = None
-                self.board.board[part_pos[0]][part_pos[1]] = original_part
-
-                # Undo the marker placement
+            # Check if this is a winning move (no need to continue if so)
+            if self.board.is_winner(self.marker):
+                # Undo move for evaluation
                 self.board.board[part_pos[0]][part_pos[1]].slots[slot_pos[0]][slot_pos[1]] = 0
+                log.info("Found winning move: Place at %s,%s then move to %s", part_pos, slot_pos, target_pos)
+                return (part_pos, slot_pos, target_pos)
 
-                # Update best move
-                if score > best_score:
-                    best_score = score
-                    best_move = (part_pos, slot_pos)
-                    best_target = target_pos
+            # Undo the marker placement
+            self.board.board[part_pos[0]][part_pos[1]].slots[slot_pos[0]][slot_pos[1]] = 0
 
-        if best_move is None:
-            # Fallback to random move if no good move found
-            valid_moves = []
-            for part_pos, slot_pos in empty_places:
-                targets = self.get_possible_targets(part_pos)
-                if targets:  # Only add if there are valid targets
-                    for target_pos in targets:
-                        valid_moves.append((part_pos, slot_pos, target_pos))
-
-            if not valid_moves:
-                return None, None, None  # No valid moves available
+        best = self.iterative_deepening(valid_moves)
 
-            # Choose a random valid move
+        if best is None:
+            # Fallback to random move if no good move found
             random_move = random.choice(valid_moves)
             return random_move[0], random_move[1], random_move[2]
 
-        print(f"AI chose move: Place at {best_move} then move part to {best_target}")
-        return best_move[0], best_move[1], best_target
+        part_pos, slot_pos, target_pos = best
+        log.info("AI chose move: Place at %s then move part to %s (depth %s, %s nodes)",
+                 (part_pos, slot_pos), target_pos, self.completed_depth, self.nodes)
+        return part_pos, slot_pos, target_pos
+
+    def iterative_deepening(self, valid_moves):
+        """
+        Searches depth 1, 2, ... and returns the best move of the deepest finished
+        iteration. Each iteration tries the previous best move first.
+        """
+        budgeted = self.time_limit is not None or self.node_limit is not None
+        # A game cannot last longer than the number of empty slots
+        last_depth = len(self.board.get_empty_places()) if budgeted else self.max_depth
+
+        self.nodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.stopped = False
+        self.completed_depth = 0
+        self.deadline = time.perf_counter() + self.time_limit if self.time_limit is not None else None
+        ordered_moves = list(valid_moves)
+        best_move = None
+
+        for depth in range(1, max(last_depth, 1) + 1):
+            self.search_depth = depth
+            # The first iteration always finishes, so there is a move to play
+            self.next_check = self.nodes + 256 if budgeted and depth > 1 else float('inf')
+            move, score = self.search_root(ordered_moves)
+            if self.stopped:
+                break
+
+            best_move = move
+            self.completed_depth = depth
+            ordered_moves.remove(move)
+            ordered_moves.insert(0, move)
+
+            # A forced win or loss within this depth will not change deeper down
+            if abs(score) > 50:
+                break
+
+        self.search_depth = self.max_depth
+        return best_move
+
+    def search_root(self, moves):
+        """One iteration over the root moves; returns (best_move, best_score)"""
+        if self.workers is not None and self.workers > 1:
+            return self.search_root_parallel(moves)
+        best_score = float('-inf')
+        best_move = None
+        for move in moves:
+            part_pos, slot_pos, target_pos = move
+            self.board.make_move(part_pos, slot_pos, target_pos, self.marker)
+
+            # Evaluate with minimax; only moves better than the best so far matter
+            score = self.minimax(0, False, best_score, float('inf'))
+
+            # Undo the part movement and the marker placement
+            self.board.unmake_move(part_pos, slot_pos, target_pos, self.marker)
+            if self.stopped:
+                return None, None
+
+            # Update best move
+            if score > best_score:
+                best_score = score
+                best_move = move
+        return best_move, best_score
+
+    def search_root_parallel(self, moves):
+        """
+        search_root with one pool task per root move. Every task starts from the best
+        exact score any worker has published, so later moves are cut as in the serial
+        search. Of equal moves the serial search keeps the first, so earlier moves that
+        failed low against that same score are searched again to see if they tie.
+        """
+        pool = self.get_pool()
+        self.shared_alpha.value = float('-inf')
+        self.shared_nodes.value = 0
+        history = self.board.str_board_history()
+        wall_deadline = None
+        if self.deadline is not None:
+            wall_deadline = time.time() + (self.deadline - time.perf_counter())
+        node_limit = self.node_limit - self.nodes if self.node_limit is not None else None
+        if self.next_check == float('inf'):
+            # Budgets do not apply to this iteration (see iterative_deepening)
+            wall_deadline = node_limit = None
+
+        futures = [pool.submit(_search_root_move, history, self.marker, self.search_depth, move,
+                               None, wall_deadline, node_limit) for move in moves]
+        results = [future.result() for future in futures]
+        self.nodes += sum(result[2] for result in results)
+        if any(result[3] for result in results):
+            self.stopped = True
+            return None, None
+
+        best_score = max(score for score, alpha, _, _ in results if score > alpha)
+        best_index = min(index for index, (score, alpha, _, _) in enumerate(results)
+                         if score > alpha and score == best_score)
+        for index in range(best_index):
+            score, alpha, _, _ = results[index]
+            if score <= alpha and alpha >= best_score:
+                # Scores are whole numbers, so beating best_score - 1 means a tie
+                score, _, nodes, _ = pool.submit(_search_root_move, history, self.marker, self.search_depth,
+                                                 moves[index], best_score - 1, None, None).result()
+                self.nodes += nodes
+                if score >= best_score:
+                    best_index = index
+                    break
+        return moves[best_index], best_score
+
+    def get_pool(self):
+        if self.pool is None:
+            self.shared_alpha = multiprocessing.Value('d', float('-inf'))
+            self.shared_nodes = multiprocessing.Value('q', 0)
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                            initargs=(self.shared_alpha, self.shared_nodes))
+        return self.pool
+
+    def close(self):
+        """Shuts down the worker processes of a parallel agent"""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def check_budget(self):
+        """Stops the search once the node or time budget is used up"""
+        nodes = self.nodes
+        if self.shared_nodes is not None:
+            # A worker of a parallel search: the budget covers every worker's nodes
+            with self.shared_nodes.get_lock():
+                self.shared_nodes.value += self.nodes - self.charged_nodes
+                nodes = self.shared_nodes.value
+            self.charged_nodes = self.nodes
+        if self.node_limit is not None and nodes >= self.node_limit:
+            self.stopped = True
+        elif self.deadline is not None and time.perf_counter() >= self.deadline:
+            self.stopped = True
+        self.next_check = self.nodes + 256
 
     def get_possible_targets(self, part_pos):
         """Get all valid positions where a part can be moved to"""
-        targets = []
-        row, col = part_pos
-
-        # Check adjacent positions (up, down, left, right)
-        possible_adjacents = [(row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)]
-
-        for pos in possible_adjacents:
-            r, c = pos
-            if 0 <= r < 3 and 0 <= c < 3 and self.board.board[r][c] is None:
-                targets.append(pos)
-
-        return targets
+        return possible_targets(self.board, part_pos)
 
     def minimax(self, depth, is_maximizing, alpha, beta):
+        self.nodes += 1
+        if self.nodes >= self.next_check:
+            self.check_budget()
+        if self.stopped:
+            return 0
+
         # Check for terminal states
         if self.board.is_winner(self.marker):
             return 100 - depth
         elif self.board.is_winner(self.opponent_marker):
             return depth - 100
-        elif self.board.is_full() or depth >= self.max_depth:
+        elif self.board.is_full() or depth >= self.search_depth:
             return self.evaluate_board()
 
+        # Use a stored result if it was searched at least as deep
+        key = self.board.hash
+        remaining = self.search_depth - depth
+        entry = self.transposition_table.probe(key)
+        if entry is not None:
+            stored_depth, stored_score, flag, _ = entry
+            if stored_depth >= remaining:
+                score = self.score_from_table(stored_score, depth)
+                if flag == EXACT:
+                    self.transposition_table.cutoffs += 1
+                    return score
+                if flag == LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if beta <= alpha:
+                    self.transposition_table.cutoffs += 1
+                    return score
+
         # Get all possible moves
-        empty_places = self.board.get_empty_places()
-        if not empty_places:
+        move_ids = legal_move_ids(self.board)
+        if not move_ids:
             return 0
+        moves = MOVE_TUPLES[self.board.empty]
 
+        window_alpha, window_beta = alpha, beta
+        best_move = None
         if is_maximizing:
             best_score = float('-inf')
-            for part_pos, slot_pos in empty_places:
-                possible_targets = self.get_possible_targets(part_pos)
-                for target_pos in possible_targets:
-                    # Make the move
-                    self.board.place_marker(part_pos, slot_pos, self.marker)
-                    original_part = self.board.board[part_pos[0]][part_pos[1]]
-                    self.board.move_part(part_pos, target_pos)
-
-                    # Evaluate
-                    score = self.minimax(depth + 1, False, alpha, beta)
-
-                    # Undo the move
-                    self.board.board[target_pos[0]][target_pos[1]] = None
-                    self.board.board[part_pos[0]][part_pos[1]] = original_part
-                    self.board.board[part_pos[0]][part_pos[1]].slots[slot_pos[0]][slot_pos[1]] = 0
-
-                    best_score = max(score, best_score)
-                    alpha = max(alpha, best_score)
-                    if beta <= alpha:
-                        break
-            return best_score
+            for tried, move_id in enumerate(move_ids):
+                part_pos, slot_pos, target_pos = moves[move_id]
+                # Make the move
+                self.board.make_move(part_pos, slot_pos, target_pos, self.marker)
+
+                # Evaluate
+                score = self.minimax(depth + 1, False, alpha, beta)
+
+                # Undo the move
+                self.board.unmake_move(part_pos, slot_pos, target_pos, self.marker)
+                if self.stopped:
+                    return 0
+
+                if score > best_score:
+                    best_score = score
+                    best_move = move_id
+                alpha = max(alpha, best_score)
+                if beta <= alpha:
+                    self.cutoffs += 1
+                    if tried == 0:
+                        self.first_move_cutoffs += 1
+                    break
         else:
             best_score = float('inf')
-            for part_pos, slot_pos in empty_places:
-                possible_targets = self.get_possible_targets(part_pos)
-                for target_pos in possible_targets:
-                    # Make the move
-                    self.board.place_marker(part_pos, slot_pos, self.opponent_marker)
-                    original_part = self.board.board[part_pos[0]][part_pos[1]]
-                    self.board.move_part(part_pos, target_pos)
-
-                    # Evaluate
-                    score = self.minimax(depth + 1, True, alpha, beta)
-
-                    # Undo the move
-                    self.board.board[target_pos[0]][target_pos[1]] = None
-                    self.board.board[part_pos[0]][part_pos[1]] = original_part
-                    self.board.board[part_pos[0]][part_pos[1]].slots[slot_pos[0]][slot_pos[1]] = 0
-
-                    best_score = min(score, best_score)
-                    beta = min(beta, best_score)
-                    if beta <= alpha:
-                        break
-            return best_score
+            for tried, move_id in enumerate(move_ids):
+                part_pos, slot_pos, target_pos = moves[move_id]
+                # Make the move
+                self.board.make_move(part_pos, slot_pos, target_pos, self.opponent_marker)
+
+                # Evaluate
+                score = self.minimax(depth + 1, True, alpha, beta)
+
+                # Undo the move
+                self.board.unmake_move(part_pos, slot_pos, target_pos, self.opponent_marker)
+                if self.stopped:
+                    return 0
+
+                if score < best_score:
+                    best_score = score
+                    best_move = move_id
+                beta = min(beta, best_score)
+                if beta <= alpha:
+                    self.cutoffs += 1
+                    if tried == 0:
+                        self.first_move_cutoffs += 1
+                    break
+
+        # Scores outside the searched window are only bounds
+        if best_score <= window_alpha:
+            flag = UPPER
+        elif best_score >= window_beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.transposition_table.store(key, remaining, self.score_to_table(best_score, depth), flag, best_move)
+        return best_score
+
+    def score_to_table(self, score, depth):
+        """Win and loss scores count plies from the root; store them relative to this node"""
+        if score > 50:
+            return score + depth
+        if score < -50:
+            return score - depth
+        return score
+
+    def score_from_table(self, score, depth):
+        """Inverse of score_to_table for a node at depth"""
+        if score > 50:
+            return score - depth
+        if score < -50:
+            return score + depth
+        return score
 
     def evaluate_board(self):
         """Heuristic evaluation function for the current board state"""
@@ -164,29 +384,24 @@ class SmartAgent(Player):
 
         # Check for potential winning patterns
         # First check for 3 markers in a row within a part
-        for row in range(3):
-            for col in range(3):
-                part = self.board.board[row][col]
-                if part is not None:
-                    # Count markers in this part
-                    my_markers = 0
-                    opponent_markers = 0
-                    for r in range(2):
-                        for c in range(2):
-                            if part.slots[r][c] == self.marker:
-                                my_markers += 1
-                            elif part.slots[r][c] == self.opponent_marker:
-                                opponent_markers += 1
-
-                    # Award points based on marker dominance
-                    if my_markers == 3:
-                        score += 5  # Almost winning
-                    elif my_markers == 2 and opponent_markers == 0:
-                        score += 2  # Good position
-                    elif opponent_markers == 3:
-                        score -= 5  # Opponent almost winning
-                    elif opponent_markers == 2 and my_markers == 0:
-                        score -= 2  # Opponent good position
+        my_mask = self.board.masks[self.marker]
+        opponent_mask = self.board.masks[self.opponent_marker]
+        for index in range(9):
+            if index != self.board.empty:
+                # Count markers in this part (its 4-bit nibble of each mask)
+                shift = 4 * index
+                my_markers = ((my_mask >> shift) & 0xF).bit_count()
+                opponent_markers = ((opponent_mask >> shift) & 0xF).bit_count()
+
+                # Award points based on marker dominance
+                if my_markers == 3:
+                    score += 5  # Almost winning
+                elif my_markers == 2 and opponent_markers == 0:
+                    score += 2  # Good position
+                elif opponent_markers == 3:
+                    score -= 5  # Opponent almost winning
+                elif opponent_markers == 2 and my_markers == 0:
+                    score -= 2  # Opponent good position
 
         # Check for potential connections between parts
         # This is simplified - for a full evaluation we'd need to check all winning patterns
@@ -194,8 +409,8 @@ class SmartAgent(Player):
         return score
 
     def get_position_key(self):
-        """Get a unique key for the current board position"""
-        return self.board.str_board_history()
+        """Get a key for the current board position, shared by its rotations and mirror images"""
+        return canonical_key(self.board)[0]
 
     def store_position_score(self, position_key, score):
         """Store a score for a given position"""
@@ -210,12 +425,13 @@ class SmartAgent(Player):
         try:
             if os.path.exists(filename):
                 with open(filename, "r") as file:
-                    self.position_scores = json.load(file)
-                    print(f"Loaded {len(self.position_scores)} positions from {filename}")
+                    self.position_scores = {canonical_history(key)[0]: score
+                                            for key, score in json.load(file).items()}
+                    log.info("Loaded %s positions from %s", len(self.position_scores), filename)
             else:
-                print(f"No position file found at {filename}, starting with empty dictionary")
+                log.info("No position file found at %s, starting with empty dictionary", filename)
         except Exception as e:
-            print(f"Error loading positions: {str(e)}")
+            log.error("Error loading positions: %s", e)
             self.position_scores = {}
 
     def save_position_scores(self, filename="agent_positions.json"):
@@ -223,6 +439,6 @@ class SmartAgent(Player):
         try:
             with open(filename, "w") as file:
                 json.dump(self.position_scores, file)
-                print(f"Saved {len(self.position_scores)} positions to {filename}")
+                log.info("Saved %s positions to %s", len(self.position_scores), filename)
         except Exception as e:
-            print(f"Error saving positions: {str(e)}")
\ No newline at end of file
+            log.error("Error saving positions: %s", e)
\ No newline at end of file
@@ -0,0 +1,79 @@
+import sqlite3
+import numpy as np
+from BinaryQTable import pack_keys, unpack_keys
+from Symmetry import canonical_history
+
+# Merges (grade, count) rows with the count-weighted mean Tournament uses; a game row has count 1
+UPSERT = """
+    INSERT INTO qtable (key, grade, count) VALUES (?, ?, ?)
+    ON CONFLICT (key) DO UPDATE SET
+        grade = (grade * count + excluded.grade * excluded.count) / (count + excluded.count),
+        count = count + excluded.count
+"""
+
+
+class SqliteQTable:
+    """
+    QTable kept in a SQLite database instead of memory. Keys are the packed canonical
+    boards of BinaryQTable. The database runs in WAL mode, so several tournament
+    processes can add games to one file while others read it.
+    """
+    def __init__(self, filename="Board-QTable.db", timeout=30.0):
+        self.filename = filename
+        # Writers from other processes are waited for up to timeout seconds
+        self.connection = sqlite3.connect(filename, timeout=timeout)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS qtable (key INTEGER PRIMARY KEY, grade REAL NOT NULL, count INTEGER NOT NULL)")
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM qtable").fetchone()[0]
+
+    def merge(self, rows):
+        """Merges (canonical board, grade, count) rows in one transaction"""
+        rows = list(rows)
+        if not rows:
+            return
+        keys = pack_keys([row[0] for row in rows]).tolist()
+        with self.connection:
+            self.connection.executemany(UPSERT, ((key, float(grade), int(count))
+                                                 for key, (board, grade, count) in zip(keys, rows)))
+
+    def add_game(self, history):
+        """Applies a game's (canonical board, grade) pairs, in order, with one batched upsert"""
+        self.merge((board, grade, 1) for board, grade in history)
+
+    def add_table(self, table):
+        """Merges a QTable dict ({key: (grade, count)}), canonicalising its keys"""
+        self.merge((canonical_history(key)[0], grade, count) for key, (grade, count) in table.items())
+
+    def get(self, key, default=None):
+        """Returns (grade, count) of the position, or default"""
+        packed = int(pack_keys([canonical_history(key)[0]])[0])
+        row = self.connection.execute("SELECT grade, count FROM qtable WHERE key = ?", (packed,)).fetchone()
+        return row if row is not None else default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def chunks(self, size=1 << 16):
+        """Streams the table through a cursor as (keys as an 'S34' array, grades, counts) slices"""
+        cursor = self.connection.execute("SELECT key, grade, count FROM qtable")
+        while True:
+            rows = cursor.fetchmany(size)
+            if not rows:
+                break
+            keys, grades, counts = zip(*rows)
+            yield (unpack_keys(np.array(keys, dtype=np.int64)), np.array(grades, dtype=np.float64),
+                   np.array(counts, dtype=np.uint32))
+
+    def to_dict(self):
+        table = {}
+        for keys, grades, counts in self.chunks():
+            table.update(zip((key.decode("ascii") for key in keys), zip(grades.tolist(), counts.tolist())))
+        return table
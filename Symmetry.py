@@ -0,0 +1,160 @@
+import numpy as np
+from Board import PART_BITS, history_to_masks, masks_to_history
+
+# The 8 symmetries of the square, as maps of a cell (row, col) of an n x n grid.
+# Applied to the 6x6 slot grid they move whole 2x2 parts onto parts, so a transformed
+# position is always a legal board with the same value.
+TRANSFORMS = [
+    lambda r, c, n: (r, c),                  # identity
+    lambda r, c, n: (c, n - 1 - r),          # rotate 90
+    lambda r, c, n: (n - 1 - r, n - 1 - c),  # rotate 180
+    lambda r, c, n: (n - 1 - c, r),          # rotate 270
+    lambda r, c, n: (r, n - 1 - c),          # mirror left-right
+    lambda r, c, n: (n - 1 - r, c),          # mirror top-bottom
+    lambda r, c, n: (c, r),                  # transpose
+    lambda r, c, n: (n - 1 - c, n - 1 - r),  # anti-transpose
+]
+
+# Transform that undoes each transform
+INVERSE = [0, 3, 2, 1, 4, 5, 6, 7]
+
+
+def _slot_bit(row, col):
+    """Bit index of the slot at (row, col) of the 6x6 slot grid"""
+    return 4 * ((row // 2) * 3 + col // 2) + (row % 2) * 2 + col % 2
+
+
+def _build_bit_maps():
+    bit_maps = []
+    for transform in TRANSFORMS:
+        bit_map = [0] * 36
+        for row in range(6):
+            for col in range(6):
+                bit_map[_slot_bit(row, col)] = _slot_bit(*transform(row, col, 6))
+        bit_maps.append(bit_map)
+    return bit_maps
+
+
+# Where every bit goes, and where every grid index goes, under each transform
+BIT_MAPS = _build_bit_maps()
+INDEX_MAPS = [[r * 3 + c for r, c in (transform(index // 3, index % 3, 3) for index in range(9))]
+              for transform in TRANSFORMS]
+
+# Transformed bits of a part nibble, per transform, grid index and nibble value
+NIBBLE_MAPS = [[[sum(1 << bit_map[4 * index + slot] for slot in range(4) if (nibble >> slot) & 1)
+                 for nibble in range(16)] for index in range(9)] for bit_map in BIT_MAPS]
+
+
+# The same tables as arrays, for canonical_masks_array
+NIBBLE_ARRAYS = np.array(NIBBLE_MAPS, dtype=np.uint64)  # (transform, grid index, nibble)
+INDEX_ARRAYS = np.array(INDEX_MAPS, dtype=np.int64)  # (transform, grid index)
+NIBBLE_SHIFTS = 4 * np.arange(9, dtype=np.uint64)
+MIN_EMPTY = INDEX_ARRAYS.min(axis=0)  # Smallest index each empty position is mapped to
+
+
+def transform_mask(mask, transform):
+    """Applies a transform to one colour mask"""
+    nibble_map = NIBBLE_MAPS[transform]
+    result = 0
+    for index in range(9):
+        result |= nibble_map[index][(mask >> (4 * index)) & PART_BITS]
+    return result
+
+
+def transform_move(move, transform):
+    """Applies a transform to a (part_pos, slot_pos, target_pos) move"""
+    part_pos, slot_pos, target_pos = move
+    row, col = TRANSFORMS[transform](part_pos[0] * 2 + slot_pos[0], part_pos[1] * 2 + slot_pos[1], 6)
+    return (row // 2, col // 2), (row % 2, col % 2), TRANSFORMS[transform](*target_pos, 3)
+
+
+def canonical_masks(masks, empty, swap_colours=False):
+    """
+    Finds the canonical form of a position among its 8 symmetric copies.
+    Returns (masks, empty, transform, swapped): the canonical masks and empty index,
+    the transform that produced them and whether the colours were swapped.
+
+    swap_colours also folds in the colour-swapped copies (16 in total). A swapped
+    position has the negated value only if the side to move is swapped as well,
+    which does not hold for QTable keys, where Blue always moves first.
+    """
+    blue, red = masks[1], masks[2]
+    best = None
+    for transform in range(8):
+        nibble_map = NIBBLE_MAPS[transform]
+        new_blue = new_red = 0
+        for index in range(9):
+            shift = 4 * index
+            new_blue |= nibble_map[index][(blue >> shift) & PART_BITS]
+            new_red |= nibble_map[index][(red >> shift) & PART_BITS]
+        new_empty = INDEX_MAPS[transform][empty]
+        candidate = (new_empty << 72) | (new_blue << 36) | new_red
+        if best is None or candidate < best[0]:
+            best = (candidate, new_blue, new_red, new_empty, transform, False)
+        if swap_colours:
+            candidate = (new_empty << 72) | (new_red << 36) | new_blue
+            if candidate < best[0]:
+                best = (candidate, new_red, new_blue, new_empty, transform, True)
+    _, new_blue, new_red, new_empty, transform, swapped = best
+    return [0, new_blue, new_red], new_empty, transform, swapped
+
+
+def canonical_masks_array(blue, red, empty):
+    """
+    canonical_masks for arrays of positions (uint64 blue and red masks, int64 empty
+    indices). Returns the canonical (blue, red, empty) arrays. Colours are never swapped.
+    """
+    # The canonical empty index is the smallest one any transform reaches, so each
+    # position only has to try the 2 transforms (8 for the centre) that reach it
+    best_empty = MIN_EMPTY[empty]
+    best_blue = np.full(len(empty), np.iinfo(np.uint64).max, dtype=np.uint64)
+    best_red = np.zeros(len(empty), dtype=np.uint64)
+    # Flat NIBBLE_ARRAYS[transform] index of every part's nibble
+    parts = 16 * np.arange(9)
+    blue_index = parts + ((blue[:, None] >> NIBBLE_SHIFTS) & np.uint64(PART_BITS)).astype(np.int64)
+    red_index = parts + ((red[:, None] >> NIBBLE_SHIFTS) & np.uint64(PART_BITS)).astype(np.int64)
+    for transform in range(8):
+        rows = np.flatnonzero(INDEX_ARRAYS[transform][empty] == best_empty)
+        nibble_map = NIBBLE_ARRAYS[transform].reshape(-1)
+        # The transformed nibbles land on disjoint bits, so summing them ORs them
+        new_blue = np.take(nibble_map, blue_index[rows]).sum(axis=1, dtype=np.uint64)
+        new_red = np.take(nibble_map, red_index[rows]).sum(axis=1, dtype=np.uint64)
+        # Same order as the (empty, blue, red) integers compared by canonical_masks
+        old_blue, old_red = best_blue[rows], best_red[rows]
+        better = (new_blue < old_blue) | ((new_blue == old_blue) & (new_red < old_red))
+        best_blue[rows] = np.where(better, new_blue, old_blue)
+        best_red[rows] = np.where(better, new_red, old_red)
+    return best_blue, best_red, best_empty
+
+
+def canonical_key(board, swap_colours=False):
+    """
+    Maps a Board to (canonical str_board_history key, transform, swapped).
+    Boards that are rotations or mirror images of each other share the key.
+    """
+    masks, empty, transform, swapped = canonical_masks(board.masks, board.empty, swap_colours)
+    return masks_to_history(masks, empty), transform, swapped
+
+
+def canonical_history(history, swap_colours=False):
+    """Same as canonical_key, for a str_board_history key"""
+    masks, empty = history_to_masks(history)
+    masks, empty, transform, swapped = canonical_masks(masks, empty, swap_colours)
+    return masks_to_history(masks, empty), transform, swapped
+
+
+def canonicalise_table(table):
+    """
+    Merges the entries of a QTable ({key: (grade, count)}) whose keys are symmetric,
+    with the same count-weighted mean the tournament uses for updates.
+    """
+    merged = {}
+    for key, (grade, count) in table.items():
+        key = canonical_history(key)[0]
+        if key in merged:
+            current_grade, current_count = merged[key]
+            total = current_count + count
+            merged[key] = ((current_grade * current_count + grade * count) / total, total)
+        else:
+            merged[key] = (grade, count)
+    return merged
@@ -1,42 +1,225 @@
 import json
 import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
 from Game import Game
+from Symmetry import canonical_history, canonicalise_table
+from BinaryQTable import BinaryQTable, write_table
+from SqliteQTable import SqliteQTable
+from Log import log, set_verbosity, get_verbosity, verbosity, QUIET
+
+
+def add_history(table, history):
+    """Folds a game's (canonical board, grade) pairs into a QTable with the running mean"""
+    for board, grade in history:
+        if board in table:
+            # Update existing entry
+            current_grade, count = table[board]
+            new_grade = (current_grade * count + grade) / (count + 1)
+            table[board] = (new_grade, count + 1)
+        else:
+            # Create new entry
+            table[board] = (grade, 1)
+
+
+def merge_tables(table, shard):
+    """
+    Merges a shard ({key: (grade, count)}) into a QTable. The count-weighted mean
+    gives the same table as adding the shard's games one by one.
+    """
+    for board, (grade, count) in shard.items():
+        if board in table:
+            current_grade, current_count = table[board]
+            total = current_count + count
+            table[board] = ((current_grade * current_count + grade * count) / total, total)
+        else:
+            table[board] = (grade, count)
+
+
+def _play_shard(player1_type, player2_type, num_games, gamma, seed, level):
+    """Worker process: plays num_games into a local QTable shard, returns (results, shard)"""
+    set_verbosity(level)
+    random.seed(seed)
+    results = {'1': 0, '2': 0, '0': 0}
+    shard = {}
+    for game_num in range(num_games):
+        result, history = Game(player1_type, player2_type, gamma).play_game()
+        results[str(result)] += 1
+        add_history(shard, [(canonical_history(board)[0], grade) for board, grade in history])
+    return results, shard
+
+
 class Tournament:
-    def __init__(self, player1_type: int, player2_type: int, num_games: int, gamma: float, json_file_name=None):
+    def __init__(self, player1_type: int, player2_type: int, num_games: int, gamma: float, json_file_name=None,
+                 compact_every=50, headless=False):
+        self.headless = headless  # Games run quietly; only the summary from print_results is shown
         self.player1_type = player1_type
         self.player2_type = player2_type
         self.num_games = num_games
         self.results = {'1': 0, '2': 0, '0': 0}  # Wins for player 1, player 2, and ties
         self.gamma = gamma
-        self.QTable = self.load_scoreboard(json_file_name)
-
-    def start_tournament(self):
-        for game_num in range(self.num_games):
-            print(f"\n=== Starting Game {game_num + 1}/{self.num_games} ===")
-            game = Game(self.player1_type, self.player2_type, self.gamma)
-            result, history = game.play_game()
-            self.results[str(result)] += 1
-
-            # Update QTable with game history
-            for board, grade in history:
-                if board in self.QTable:
-                    # Update existing entry
-                    current_grade, count = self.QTable[board]
-                    new_grade = (current_grade * count + grade) / (count + 1)
-                    self.QTable[board] = (new_grade, count + 1)
+        self.save_file = json_file_name or "Board-QTable.json"
+        # Every game is appended to the log; the whole table is only rewritten every compact_every games.
+        # Without a file the QTable starts empty and is not logged: a log next to the default file
+        # belongs to that file's table
+        self.log_file = self.save_file + ".log" if json_file_name is not None else None
+        self.old_log_file = self.save_file + ".log.old"  # The log while a compaction replaces the table
+        self.compact_every = compact_every
+        # A .db file keeps the QTable in SQLite, updated in place after every game
+        self.database = SqliteQTable(self.save_file) if self.save_file.endswith(".db") else None
+        self.QTable = {} if self.database is not None else self.load_scoreboard(json_file_name)
+        if self.database is None and self.log_file is not None:
+            self.replay_log()
+        elif self.database is None and (os.path.exists(self.save_file + ".log") or os.path.exists(self.old_log_file)):
+            # Saving would replace the table that log belongs to, and it would later be replayed onto ours
+            raise FileExistsError(f"{self.save_file} has games logged since it was saved; "
+                                  f"pass json_file_name='{self.save_file}' to recover them first")
+
+    def start_tournament(self, workers=1, seed=None):
+        """Plays the games, in workers processes when workers > 1 (see start_parallel)"""
+        with verbosity(QUIET if self.headless else get_verbosity()):
+            if workers > 1:
+                return self.start_parallel(workers, seed)
+            start = time.perf_counter()
+            for game_num in range(self.num_games):
+                log.info("\n=== Starting Game %s/%s ===", game_num + 1, self.num_games)
+                game = Game(self.player1_type, self.player2_type, self.gamma)
+                result, history = game.play_game()
+                self.results[str(result)] += 1
+
+                # Symmetric boards share one entry
+                history = [(canonical_history(board)[0], grade) for board, grade in history]
+                if self.database is not None:
+                    self.database.add_game(history)  # One transaction per game
                 else:
-                    # Create new entry
-                    self.QTable[board] = (grade, 1)
+                    self.update_qtable(history)
+
+                    # Log the game so a crash loses at most the game being played
+                    self.append_log(history)
+                    if (game_num + 1) % self.compact_every == 0:
+                        self.compact()
+
+            # Final save and print results
+            if self.database is None:
+                self.compact()
+            seconds = time.perf_counter() - start
+            self.print_results(seconds)
+            return seconds
 
-            # Save after each game to avoid losing data
-            if game_num % 5 == 0:
-                self.save_scoreboard("Board-QTable.json")
+    def update_qtable(self, history):
+        """Folds a game's (canonical board, grade) pairs into the QTable"""
+        add_history(self.QTable, history)
 
-        # Final save and print results
-        self.save_scoreboard("Board-QTable.json")
-        self.print_results()
+    def append_log(self, history):
+        """Appends one game as a single JSON line and forces it to disk"""
+        if self.log_file is None:
+            return
+        with open(self.log_file, "a") as file:
+            file.write(json.dumps(history) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def replay_log(self):
+        """
+        Applies the games logged since the last compaction to the loaded QTable. If a
+        compaction was cut off, its log is only replayed when the table was not replaced.
+        """
+        if os.path.exists(self.old_log_file):
+            temporary = self.save_file + ".tmp"
+            if os.path.exists(temporary):
+                # The new table never replaced the old one, which lacks these games
+                os.remove(temporary)
+                os.replace(self.old_log_file, self.log_file)
+            else:
+                os.remove(self.old_log_file)  # The saved table already holds its games
+        self.replay_file(self.log_file)
+
+    def replay_file(self, filename):
+        """
+        Applies every complete line of a log to the QTable: a game's (board, grade) pairs
+        or a shard's (board, grade, count) rows
+        """
+        if not os.path.exists(filename):
+            return
+        games = 0
+        valid_bytes = 0
+        with open(filename, "r+b") as file:
+            for line in file:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated line")
+                    history = json.loads(line)
+                except ValueError:
+                    # A game cut off by a crash: drop it, so new games start on a fresh line
+                    file.truncate(valid_bytes)
+                    break
+                if history and len(history[0]) == 3:
+                    # A shard of a parallel tournament (see start_parallel)
+                    merge_tables(self.QTable, {board: (grade, count) for board, grade, count in history})
+                else:
+                    self.update_qtable(history)
+                valid_bytes += len(line)
+                games += 1
+        log.info("Replayed %s games from %s", games, filename)
 
-    def print_results(self):
+    def compact(self):
+        """
+        Saves the whole QTable, which then holds every logged game, and starts an empty log.
+        The log is set aside while the table is replaced, so replay_log can tell whether a
+        compaction cut off by a crash got that far (see replay_log).
+        """
+        temporary = self.save_file + ".tmp"
+        if not self.write_scoreboard(temporary, self.save_file):
+            return
+        if self.log_file is not None and os.path.exists(self.log_file):
+            os.replace(self.log_file, self.old_log_file)
+        os.replace(temporary, self.save_file)
+        log.info("QTable saved to %s", self.save_file)
+        if self.log_file is not None and os.path.exists(self.old_log_file):
+            os.remove(self.old_log_file)
+
+    def start_parallel(self, workers, seed=None, batch_size=None):
+        """
+        Splits the games into batches played by a pool of worker processes. Each batch
+        gets its own seed and fills its own QTable shard, which is logged and merged
+        into the QTable as soon as the batch finishes, so a crash loses at most the
+        batches still being played.
+        """
+        with verbosity(QUIET if self.headless else get_verbosity()):
+            if seed is None:
+                seed = random.randrange(1 << 30)
+            batch_size = batch_size or max(1, min(self.compact_every, -(-self.num_games // workers)))
+            batches = [min(batch_size, self.num_games - start) for start in range(0, self.num_games, batch_size)]
+            log.info("Playing %s games in %s batches on %s processes", self.num_games, len(batches), workers)
+            start = time.perf_counter()
+            merged = 0
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_play_shard, self.player1_type, self.player2_type, games, self.gamma, seed + i,
+                                       get_verbosity())
+                           for i, games in enumerate(batches)]
+                for future, games in zip(futures, batches):
+                    results, shard = future.result()
+                    for result, wins in results.items():
+                        self.results[result] += wins
+                    if self.database is not None:
+                        self.database.merge((board, grade, count) for board, (grade, count) in shard.items())
+                    else:
+                        # Logged as (board, grade, count) rows, which replay_file merges like the shard
+                        self.append_log([(board, grade, count) for board, (grade, count) in shard.items()])
+                        merge_tables(self.QTable, shard)
+                        merged += games
+                        if merged >= self.compact_every:
+                            self.compact()
+                            merged = 0
+            seconds = time.perf_counter() - start
+
+            if self.database is None:
+                self.compact()
+            self.print_results(seconds, workers)
+            return seconds
+
+    def print_results(self, seconds=None, workers=1):
         tie_count = self.results['0']
         player1_count = self.results['1']
         player2_count = self.results['2']
@@ -45,45 +228,70 @@ class Tournament:
         print(f"Player 1 (Blue) won: {player1_count} games ({player1_count / self.num_games * 100:.1f}%)")
         print(f"Player 2 (Red) won: {player2_count} games ({player2_count / self.num_games * 100:.1f}%)")
         print(f"Ties: {tie_count} games ({tie_count / self.num_games * 100:.1f}%)")
+        if seconds:
+            print(f"Speed: {self.num_games / seconds:.1f} games/s on {workers} process(es)")
 
     def load_scoreboard(self, json_file_name=None):
         """Loads the QTable from a json file"""
         if json_file_name is None:
-            print("No file specified. Starting with an empty QTable")
+            log.info("No file specified. Starting with an empty QTable")
             return {}
 
         if os.path.exists(json_file_name):
             try:
-                with open(json_file_name, "r") as file:
-                    dictionary = json.load(file)
-                    print(f"QTable loaded from {json_file_name}")
-                    return dictionary
+                if json_file_name.endswith(".bin"):
+                    dictionary = BinaryQTable(json_file_name).to_dict()  # Already canonical
+                else:
+                    with open(json_file_name, "r") as file:
+                        dictionary = canonicalise_table(json.load(file))
+                log.info("QTable loaded from %s", json_file_name)
+                return dictionary
             except Exception as e:
-                print(f"Error loading QTable: {str(e)}")
+                log.error("Error loading QTable: %s", e)
                 return {}
         else:
-            print(f"File {json_file_name} not found. Starting with an empty QTable")
+            log.info("File %s not found. Starting with an empty QTable", json_file_name)
             return {}
 
     def save_scoreboard(self, filename="Board-QTable.json"):
-        """Saves the QTable to a json file"""
+        """
+        Saves the QTable to a json file, or in the binary format if filename ends with .bin.
+        The table is written to a temporary file first, so a crash never leaves half a table.
+        Returns whether it was saved.
+        """
+        temporary = filename + ".tmp"
+        if not self.write_scoreboard(temporary, filename):
+            return False
+        os.replace(temporary, filename)
+        log.info("QTable saved to %s", filename)
+        return True
+
+    def write_scoreboard(self, temporary, filename):
+        """Writes the QTable to temporary in the format of filename; returns whether it was written"""
         try:
-            with open(filename, "w") as file:
-                json.dump(self.QTable, file)
-                print(f"QTable saved to {filename}")
+            if filename.endswith(".bin"):
+                write_table(temporary, self.QTable, canonical=True)
+            else:
+                with open(temporary, "w") as file:
+                    json.dump(self.QTable, file)
+            return True
         except Exception as e:
-            print(f"Error saving QTable: {str(e)}")
+            log.error("Error saving QTable: %s", e)
+            return False
 
     # Example of running a tournament
 
 
 if __name__ == "__main__":
+    # Usage: python Tournament.py [--headless]  (--headless prints only the results)
+    import sys
     # Player types: 1=Human, 2=Random, 3=Smart, 4 = AI
     tournament = Tournament(
         player1_type=4,  # SmartAgent for player 1 (Blue)
         player2_type=2,  # Random for player 2 (Red)
         num_games = 100,
         gamma=0.9,
-        json_file_name="Board-QTable.json"
+        json_file_name="Board-QTable.json",
+        headless="--headless" in sys.argv
     )
     tournament.start_tournament()
\ No newline at end of file
@@ -0,0 +1,75 @@
+# Kinds of stored scores
+EXACT = 0  # the true minimax value
+LOWER = 1  # the search failed high, the value is at least the score
+UPPER = 2  # the search failed low, the value is at most the score
+
+
+class TranspositionTable:
+    """
+    Fixed-size table of search results keyed by the Board's Zobrist hash.
+    Each slot holds (key, depth, score, flag, best_move, generation); a position
+    maps to slot key % size, so memory never grows past max_entries slots.
+    A slot is overwritten by a search that is at least as deep, by the same
+    position, or when its entry is left over from an earlier move (generation).
+    """
+    def __init__(self, max_entries=1 << 18):
+        self.size = max_entries
+        self.entries = [None] * max_entries
+        self.generation = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0  # the position was found
+        self.cutoffs = 0  # the stored result answered the node without a search
+        self.stores = 0
+        self.overwrites = 0  # a different position was evicted
+        self.rejected = 0  # a store lost to a deeper entry of another position
+
+    def new_search(self):
+        """Marks entries stored so far as old, so they are replaced first"""
+        self.generation += 1
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.generation = 0
+
+    def probe(self, key):
+        """Returns (depth, score, flag, best_move) for the position, or None"""
+        self.probes += 1
+        entry = self.entries[key % self.size]
+        if entry is None or entry[0] != key:
+            return None
+        self.hits += 1
+        return entry[1], entry[2], entry[3], entry[4]
+
+    def store(self, key, depth, score, flag, best_move):
+        index = key % self.size
+        entry = self.entries[index]
+        if entry is not None and entry[0] != key:
+            if entry[5] == self.generation and entry[1] > depth:
+                self.rejected += 1
+                return
+            self.overwrites += 1
+        self.stores += 1
+        self.entries[index] = (key, depth, score, flag, best_move, self.generation)
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def filled(self):
+        """Number of occupied slots"""
+        return sum(1 for entry in self.entries if entry is not None)
+
+    def stats(self):
+        return {
+            "probes": self.probes,
+            "hits": self.hits,
+            "hit_rate": self.hit_rate(),
+            "cutoffs": self.cutoffs,
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+            "rejected": self.rejected,
+            "filled": self.filled(),
+            "size": self.size,
+        }